@@ -1,17 +1,484 @@
 import tkinter as tk
-from tkinter import scrolledtext, messagebox, END, ttk
+from tkinter import scrolledtext, messagebox, filedialog, END, ttk
 import tkinter.font as tkFont
+import os
 import threading
-import asyncio
-from asyncio import Event
-from Ollama import Ollama
+import queue
+import time
+
+# Ollama.py (with asyncio, http.client, sqlite3, ...) and SessionStore.py are imported by load_backend()
+# once the window is shown, so they do not delay the first paint
+Ollama = OllamaClient = ConnectionPool = ModelCatalog = CancelToken = RequestScheduler = SessionStore = None
+BACKGROUND = None
+
+
+DEFAULT_BASE_URL = "http://localhost:11434"
+DEFAULT_MODEL = "llama3"
+
+SESSION_DB = os.path.join(os.path.expanduser("~"), ".ollama_gui_sessions.db")
+HISTORY_PAGE_SIZE = 50  # messages loaded per page when opening or scrolling a stored session
+
+DOCUMENT_INDEX = os.path.join(os.path.expanduser("~"), ".ollama_gui_index")  # .f32/.jsonl files of the VectorIndex
+EMBED_MODEL = "nomic-embed-text"  # embedding model of a new document index
+
+KEEP_ALIVE_OPEN = -1  # keep the model loaded as long as the GUI is open
+KEEP_ALIVE_CLOSED = "5m"  # Ollama's default unload timeout, restored on exit
+RELEASE_TIMEOUT = 5.0  # seconds the window waits on exit for the releases, a busy server must not block it
+
+
+def load_backend() -> None:
+    global Ollama, OllamaClient, ConnectionPool, ModelCatalog, CancelToken, RequestScheduler, BACKGROUND, SessionStore
+    from Ollama import Ollama, OllamaClient, ConnectionPool, ModelCatalog, CancelToken, RequestScheduler, BACKGROUND
+    from SessionStore import SessionStore
+
+
+def warm_up_model(ollama: "Ollama", ui: "UIDispatcher") -> None:
+    # validate and load the model with the session's prompt prefix in the background, errors are shown once the UI is up
+    def load():
+        try:
+            ollama.preload()
+        except Exception as e:
+            ui.call(messagebox.showerror, "Error", f"Could not load model {ollama.model}: {str(e)}")
+    threading.Thread(target=load, daemon=True).start()
+
+
+def release_model(ollama: "Ollama", model:str=None) -> None:
+    # hand the loaded model (or a model the client used before) back to the server's default unload timer
+    try:
+        if model is None:
+            ollama.load_model(keep_alive=KEEP_ALIVE_CLOSED)
+        else:
+            ollama._client.load_model(model, keep_alive=KEEP_ALIVE_CLOSED)
+    except Exception:
+        pass
+
+
+class UIDispatcher:
+    """Collects UI updates from any thread and applies them on the Tk thread in batches.
+
+    Text inserts are queued and flushed at most `fps` times per second; consecutive inserts into
+    the same widget with the same tag are coalesced into one Text.insert call, so the rendering
+    cost per frame stays bounded no matter how fast a model emits tokens. Other threads never call
+    into Tk, they only queue: where Tk can watch file descriptors (not on Windows) a byte written
+    to a pipe wakes the Tk thread, so an idle app does not poll. Otherwise the Tk thread polls the
+    queue, at the frame rate while updates keep coming and every `idle_interval` seconds else.
+    """
+    def __init__(self, root: tk.Tk, fps: int = 60, idle_interval: float = 0.1) -> None:
+        self.root = root
+        self.interval = 1.0 / fps
+        self.idle_interval = idle_interval
+        self._queue = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._scheduled = False  # a wakeup is pending or a flush is scheduled (pipe mode)
+        self._last_flush = self._last_update = 0.0
+        self._pipe = None  # (read fd, write fd)
+        try:
+            read_fd, write_fd = os.pipe()
+        except OSError:
+            read_fd = write_fd = None
+        if read_fd is not None:
+            try:
+                os.set_blocking(write_fd, False)
+                root.tk.createfilehandler(read_fd, tk.READABLE, self._woken)
+                self._pipe = (read_fd, write_fd)
+            except (AttributeError, OSError, tk.TclError):  # e.g. Windows
+                os.close(read_fd)
+                os.close(write_fd)
+        if self._pipe is None:
+            self.root.after(int(idle_interval * 1000), self._poll)
+
+    def insert(self, widget: tk.Text, text: str, tag: str = None) -> None:
+        self._queue.put((widget, text, tag))
+        self._wake()
+
+    def call(self, func, *args) -> None:
+        # run an arbitrary callable (e.g. a messagebox) on the Tk thread with the next flush
+        self._queue.put((func, args, None))
+        self._wake()
+
+    def _wake(self) -> None:
+        # any thread; without the pipe the poll loop picks the update up
+        with self._lock:
+            if self._pipe is None or self._scheduled:
+                return
+            self._scheduled = True
+            try:
+                os.write(self._pipe[1], b"x")
+            except OSError:  # pipe full, a wakeup is pending anyway
+                pass
+
+    def _woken(self, fd: int, mask: int) -> None:
+        # Tk thread: flush now, or after the rest of the frame interval
+        os.read(fd, 4096)
+        delay = self._last_flush + self.interval - time.perf_counter()
+        self.root.after(max(0, int(delay * 1000)), self._flush)
+
+    def _poll(self) -> None:
+        if not self._queue.empty():
+            self._flush()
+            self._last_update = self._last_flush
+        active = time.perf_counter() - self._last_update < self.idle_interval
+        self.root.after(int((self.interval if active else self.idle_interval) * 1000), self._poll)
+
+    def close(self) -> None:
+        """Stop watching the pipe once the mainloop ended; later updates are only queued."""
+        with self._lock:
+            if self._pipe is not None:
+                try:
+                    self.root.tk.deletefilehandler(self._pipe[0])
+                except tk.TclError:
+                    pass
+                for fd in self._pipe:
+                    os.close(fd)
+                self._pipe = None
+
+    def _flush(self) -> None:
+        with self._lock:
+            self._scheduled = False
+        self._last_flush = time.perf_counter()
+        pending = []  # [widget, [text, ...], tag] runs of coalesced inserts
+        touched = set()
+        while True:
+            try:
+                target, payload, tag = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if hasattr(target, "insert"):  # a Text widget or a VirtualHistoryView
+                if pending and pending[-1][0] is target and pending[-1][2] == tag:
+                    pending[-1][1].append(payload)
+                else:
+                    pending.append([target, [payload], tag])
+                continue
+            # keep ordering between inserts and calls
+            self._apply(pending, touched)
+            pending = []
+            target(*payload)
+        self._apply(pending, touched)
+        for widget in touched:
+            widget.see(tk.END)
+
+    @staticmethod
+    def _apply(pending: list, touched: set) -> None:
+        for widget, texts, tag in pending:
+            try:
+                widget.insert(tk.END, "".join(texts), tag)
+            except tk.TclError:
+                continue  # the widget was destroyed meanwhile, e.g. a closed window
+            touched.add(widget)
+
+
+class VirtualHistoryView:
+    """Shows a long transcript in a Text widget while only keeping a window of it rendered.
+
+    The transcript is a list of blocks (consecutive text with the same tag, e.g. one message).
+    At most `window` blocks live in the widget; scrolling to the top or bottom edge renders the
+    next `page` blocks on that side and drops as many on the other, and at the very top
+    load_older() may supply older blocks, e.g. from a SessionStore. Rendering cost therefore does
+    not depend on the transcript length. Implements insert()/see() so a UIDispatcher can target
+    it like a Text widget.
+    """
+    def __init__(self, text: tk.Text, window: int = 60, page: int = 20, load_older=None) -> None:
+        self.text = text
+        self.window = window
+        self.page = page
+        self.load_older = load_older  # callable() -> list of (text, tag) blocks before the first one, or []
+        self.blocks = []  # [block_id, tag, [chunks]]
+        self.start = self.end = 0  # rendered blocks are blocks[start:end]
+        self._next_id = 0
+        self._paging = False
+        self.text.configure(yscrollcommand=self._scrolled)
+
+    def _new_block(self, text: str, tag: str) -> list:
+        self._next_id += 1
+        return [self._next_id, tag, [text]]
+
+    @staticmethod
+    def _content(block: list) -> str:
+        if len(block[2]) > 1:
+            block[2] = ["".join(block[2])]
+        return block[2][0]
+
+    def insert(self, index, text: str, tag: str = None) -> None:
+        """Append text to the transcript (only appending at the end is supported)."""
+        following = self.end == len(self.blocks)
+        if self.blocks and self.blocks[-1][1] == tag:
+            self.blocks[-1][2].append(text)
+            if following:
+                self.text.insert(tk.END, text, tag)
+            return
+        self.blocks.append(self._new_block(text, tag))
+        if following:
+            self._render_bottom(1)
+            self._trim_top()
+
+    def see(self, index) -> None:
+        # only follow new output while the end of the transcript is rendered
+        if self.end == len(self.blocks):
+            self.text.see(tk.END)
+
+    def clear(self) -> None:
+        self.text.delete("1.0", tk.END)
+        for block in self.blocks[self.start:self.end]:
+            self.text.mark_unset(f"block{block[0]}")
+        self.blocks = []
+        self.start = self.end = 0
+
+    def load(self, blocks: list) -> None:
+        """Show a transcript of (text, tag) blocks, scrolled to its end."""
+        self.clear()
+        self.blocks = [self._new_block(text, tag) for text, tag in blocks]
+        self.start = self.end = len(self.blocks)
+        self._render_top(min(self.window, len(self.blocks)))
+        self.text.see(tk.END)
+
+    def _render_bottom(self, count: int) -> None:
+        for block in self.blocks[self.end:self.end + count]:
+            mark = f"block{block[0]}"
+            self.text.mark_set(mark, "end-1c")
+            self.text.mark_gravity(mark, tk.LEFT)
+            self.text.insert(tk.END, self._content(block), block[1])
+            self.end += 1
+
+    def _render_top(self, count: int) -> None:
+        for block in reversed(self.blocks[max(0, self.start - count):self.start]):
+            if self.start < self.end:
+                # the current first mark has to move behind the inserted text
+                first = f"block{self.blocks[self.start][0]}"
+                self.text.mark_gravity(first, tk.RIGHT)
+                self.text.insert("1.0", self._content(block), block[1])
+                self.text.mark_gravity(first, tk.LEFT)
+            else:
+                self.text.insert("1.0", self._content(block), block[1])
+            mark = f"block{block[0]}"
+            self.text.mark_set(mark, "1.0")
+            self.text.mark_gravity(mark, tk.LEFT)
+            self.start -= 1
+
+    def _trim_top(self) -> None:
+        while self.end - self.start > self.window:
+            mark = f"block{self.blocks[self.start][0]}"
+            self.text.delete(mark, f"block{self.blocks[self.start + 1][0]}")
+            self.text.mark_unset(mark)
+            self.start += 1
+
+    def _trim_bottom(self) -> None:
+        while self.end - self.start > self.window:
+            mark = f"block{self.blocks[self.end - 1][0]}"
+            self.text.delete(mark, "end-1c")
+            self.text.mark_unset(mark)
+            self.end -= 1
+
+    def _scrolled(self, first, last) -> None:
+        self.text.vbar.set(first, last)
+        if self._paging:
+            return
+        first, last = float(first), float(last)
+        # page at an edge of the rendered range, or while the window is not filled yet
+        if first <= 0.0 and (last < 1.0 or self.end - self.start < self.window) \
+                and (self.start > 0 or self.load_older is not None):
+            self._paging = True
+            self.text.after_idle(self._page_up)
+        elif last >= 1.0 and first > 0.0 and self.end < len(self.blocks):
+            self._paging = True
+            self.text.after_idle(self._page_down)
+
+    def _keep_view(self, change) -> None:
+        # apply change() without moving the line at the top of the view
+        self.text.mark_set("view_anchor", "@0,0")
+        self.text.mark_gravity("view_anchor", tk.RIGHT)
+        change()
+        self.text.yview("view_anchor")
+        self.text.mark_unset("view_anchor")
+
+    def _page_up(self) -> None:
+        try:
+            if self.start == 0 and self.load_older is not None:
+                if not (older := self.load_older()):
+                    return
+                self.blocks[:0] = [self._new_block(text, tag) for text, tag in older]
+                self.start += len(older)
+                self.end += len(older)
+            if self.start > 0:
+                self._keep_view(lambda: (self._render_top(self.page), self._trim_bottom()))
+        finally:
+            self._paging = False
+
+    def _page_down(self) -> None:
+        try:
+            self._keep_view(lambda: (self._render_bottom(self.page), self._trim_top()))
+        finally:
+            self._paging = False
+
+
+class AsyncioThread:
+    """Runs an asyncio event loop on a dedicated daemon thread next to the Tk mainloop.
+
+    Coroutines are handed over with submit(); results flow back into Tk through a UIDispatcher,
+    so neither loop has to poll the other.
+    """
+    def __init__(self) -> None:
+        import asyncio  # only imported with the backend, see load_backend()
+        self._asyncio = asyncio
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        self._asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def submit(self, coro):
+        """Run coro on the loop; returns its concurrent.futures.Future."""
+        return self._asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def call_soon(self, func, *args) -> None:
+        self.loop.call_soon_threadsafe(func, *args)
+
+    def stop(self) -> None:
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+
+class ChatSession:
+    """One conversation tab of the ChatApp: its own Ollama instance, model, history view and stored session.
+
+    Every tab streams on its own worker thread, so several answers can be generated at once; the
+    connections come from the pool shared by all clients of the same server.
+    """
+    def __init__(self, app:"ChatApp", model:str, number:int):
+        self.app = app
+        self.number = number
+        self.model = model
+        self._ollama = None  # created on first use, see ollama
+        self._lock = threading.Lock()
+        self.ollama_thread = None  # To track the current sending thread
+        self.cancel_token = None
+        self.last_response = ""
+        self.last_record = None  # timings of the last request, shown in the status bar
+
+        # Persistent session, every completed message is appended to the store
+        self.session_id = None  # created with the first message
+        self.oldest_message_id = None  # paging cursor of a loaded session
+
+        # Chat history
+        self.frame = tk.Frame(app.notebook, bg='#2E2E2E')
+        self.chat_history = scrolledtext.ScrolledText(self.frame, width=60, height=20, wrap=tk.WORD,
+                                                      bg='#1E1E1E', fg='#D3D3D3', insertbackground='white')
+        self.chat_history.pack(fill=tk.BOTH, expand=True)
+        self.chat_history.tag_config("user_color", foreground="white")
+        self.chat_history.tag_config("assistant_color", foreground="#87CEEB")
+        # only a window of the transcript is rendered, older stored messages page in on scrolling up
+        self.history = VirtualHistoryView(self.chat_history, load_older=self.fetch_older_blocks)
+
+    @property
+    def ollama(self) -> "Ollama":
+        # built on first use (from any thread), so a new tab or window does not wait for the backend
+        with self._lock:
+            if self._ollama is None:
+                self.app.ensure_backend()
+                self._ollama = Ollama(model=self.model, keep_alive=KEEP_ALIVE_OPEN, catalog=self.app.catalog,
+                                      scheduler=self.app.scheduler)
+                self._ollama.conversation.add_listener(self.store_message, self.unstore_message)
+                self._ollama.metrics.on_record(lambda record: self.app.ui.call(self.app.session_recorded, self, record))
+                # one pooled connection per tab, so a streaming tab never waits for another
+                ConnectionPool.for_url(DEFAULT_BASE_URL).ensure_size(len(self.app.sessions))
+            return self._ollama
+
+    @property
+    def started(self) -> bool:
+        """Whether the tab's Ollama client was created, i.e. the tab was used."""
+        return self._ollama is not None
+
+    @property
+    def current_model(self) -> str:
+        return self._ollama.model if self._ollama is not None else self.model
+
+    @property
+    def title(self) -> str:
+        return f"{self.number}: {self.current_model}" + (" ..." if self.busy() else "")
+
+    def busy(self) -> bool:
+        return self.ollama_thread is not None and self.ollama_thread.is_alive()
+
+    def start_send_message(self, user_input:str, use_documents:bool=False):
+        # write user_input to the chat history and request the answer in a worker thread
+        self.app.ensure_backend()
+        self.history.insert(tk.END, f"{user_input}\n", "user_color")
+        self.history.see(tk.END)
+        self.cancel_token = CancelToken()
+        self.ollama_thread = threading.Thread(target=self.send_message, args=(user_input, self.cancel_token, use_documents),
+                                              daemon=True)
+        self.ollama_thread.start()
+        self.app.update_tab(self)
+
+    def send_message(self, user_input:str, cancel:"CancelToken", use_documents:bool=False):
+        # request from Ollama (runs in a worker thread, so all widget updates go through the dispatcher)
+        ui = self.app.ui
+        try:
+            # with documents enabled the most similar indexed chunks are sent along with the prompt,
+            # the conversation and the stored session only keep what the user typed
+            retrieved = self.app.ensure_knowledge().context(user_input) if use_documents else None
+            # call Ollama API and write the LLM response to chat history window token by token
+            response = ""
+            for token in self.ollama.chat_stream(user_input, cancel=cancel, retrieved=retrieved):
+                ui.insert(self.history, token, "assistant_color")
+                response += token
+            ui.insert(self.history, "\n\n", "assistant_color")
+            # store the response
+            self.last_response = response
+        except Exception as e:
+            ui.call(messagebox.showerror, "Error", f"An error occurred: {str(e)}")
+        finally:
+            ui.call(self.app.update_tab, self)
+
+    def cancel_request(self):
+        # close the connection of the ongoing request, the server stops generating
+        if self.cancel_token is not None:
+            self.cancel_token.cancel()
+
+    def store_message(self, message:dict):
+        # called by the conversation (worker thread) whenever a message is complete
+        if self.session_id is None:
+            self.session_id = self.app.store.new_session(self.ollama.model, self.ollama.system)
+        self.app.store.append(self.session_id, message)
+
+    def unstore_message(self, message:dict):
+        if self.session_id is not None:
+            self.app.store.remove_last(self.session_id)
+
+    def load_session(self, session_id:int):
+        # the newest page is shown and becomes the context of the conversation, older pages load on scrolling up
+        messages = self.app.store.messages(session_id, limit=HISTORY_PAGE_SIZE)
+        self.ollama.conversation.load(messages)
+        self.session_id = session_id
+        self.oldest_message_id = messages[0]["id"] if messages else None
+        self.last_response = next((m["content"] for m in reversed(messages) if m["role"] == "assistant"), "")
+        self.history.load([self.format_message(message) for message in messages])
+        # the server evaluates the loaded history now instead of with the next prompt
+        warm_up_model(self.ollama, self.app.ui)
+
+    @staticmethod
+    def format_message(message:dict) -> tuple:
+        if message["role"] == "user":
+            return f"{message['content']}\n", "user_color"
+        return f"{message['content']}\n\n", "assistant_color"
+
+    def fetch_older_blocks(self) -> list:
+        # called by the history view when scrolled above the oldest loaded message
+        if self.oldest_message_id is None:
+            return []
+        messages = self.app.store.messages(self.session_id, before_id=self.oldest_message_id, limit=HISTORY_PAGE_SIZE)
+        self.oldest_message_id = messages[0]["id"] if messages else None
+        return [self.format_message(message) for message in messages]
 
 
 class ChatApp:
     def __init__(self):
-        # Ollama
-        self.ollama = Ollama(model="llama3")
-        self.ollama_thread = None  # To track the current sending thread
+        # Persistent sessions and the shared model list, set up by ensure_backend() after the window is shown
+        self.store = None
+        self.catalog = None
+        self.scheduler = None  # queues the requests of all tabs, interactive before background
+        self.knowledge = None  # document index for retrieval, see ensure_knowledge()
+        self._backend_lock = threading.Lock()
 
         # Main GUI window
         self.root = tk.Tk()
@@ -24,10 +491,17 @@ class ChatApp:
         self.root.option_add("*Font", self.custom_font)  # Set font of all widgets in root
         self.root.configure(bg='#2E2E2E')  # Set a dark background
 
-        # Chat history
-        self.chat_history = scrolledtext.ScrolledText(self.root, width=60, height=20, wrap=tk.WORD,
-                                                      bg='#1E1E1E', fg='#D3D3D3', insertbackground='white')
-        self.chat_history.grid(row=0, column=0, columnspan=4, padx=10, pady=10, sticky="nsew")
+        # Conversation tabs, all tabs share one model list
+        self.ui = UIDispatcher(self.root)  # thread-safe, batched updates of the chat history
+        self.model_dropdown = None
+        self.compare_model_list = None  # model Listbox of the Compare window, updated like the dropdown
+        self.use_documents = tk.BooleanVar(value=False)  # augment prompts with indexed documents
+        self.notebook = ttk.Notebook(self.root)
+        self.notebook.grid(row=0, column=0, columnspan=10, padx=10, pady=10, sticky="nsew")
+        self.notebook.bind("<<NotebookTabChanged>>", self.tab_changed)
+        self.sessions = []
+        self.next_tab_number = 1
+        self.new_tab()
 
         # User input
         self.input_field = scrolledtext.ScrolledText(self.root, width=40, height=6, wrap=tk.WORD,
@@ -47,81 +521,438 @@ class ChatApp:
         self.config_button = tk.Button(self.root, text="Config", command=self.open_config_window, bg='#6D8764', fg='white')
         self.config_button.grid(row=1, column=3, padx=10, pady=10, sticky="nsew")
 
+        # Stop button
+        self.stop_button = tk.Button(self.root, text="Stop", command=self.cancel_request, bg='#6D8764', fg='white')
+        self.stop_button.grid(row=1, column=4, padx=10, pady=10, sticky="nsew")
+
+        # History button
+        self.history_button = tk.Button(self.root, text="History", command=self.open_history_window, bg='#6D8764', fg='white')
+        self.history_button.grid(row=1, column=5, padx=10, pady=10, sticky="nsew")
+
+        # New tab button
+        self.new_tab_button = tk.Button(self.root, text="New tab", command=self.new_tab, bg='#6D8764', fg='white')
+        self.new_tab_button.grid(row=1, column=6, padx=10, pady=10, sticky="nsew")
+
+        # Close tab button
+        self.close_tab_button = tk.Button(self.root, text="Close tab", command=self.close_tab, bg='#6D8764', fg='white')
+        self.close_tab_button.grid(row=1, column=7, padx=10, pady=10, sticky="nsew")
+
+        # Compare button
+        self.compare_button = tk.Button(self.root, text="Compare", command=self.open_compare_window, bg='#6D8764', fg='white')
+        self.compare_button.grid(row=1, column=8, padx=10, pady=10, sticky="nsew")
+
+        # Documents button
+        self.documents_button = tk.Button(self.root, text="Documents", command=self.open_documents_window, bg='#6D8764', fg='white')
+        self.documents_button.grid(row=1, column=9, padx=10, pady=10, sticky="nsew")
+
+        # Status bar with the timings of the last request of the selected tab
+        self.status_var = tk.StringVar(value="")
+        self.status_bar = tk.Label(self.root, textvariable=self.status_var, anchor="w", bg='#2E2E2E', fg='#A0A0A0')
+        self.status_bar.grid(row=2, column=0, columnspan=10, padx=10, pady=(0, 5), sticky="ew")
+
         # Grid configuration to make widgets resize with the window
         self.root.grid_rowconfigure(0, weight=5)
         self.root.grid_rowconfigure(1, weight=1)
+        self.root.grid_rowconfigure(2, weight=0)
         self.root.grid_columnconfigure(0, weight=1)
-        self.root.grid_columnconfigure(1, weight=0)
-        self.root.grid_columnconfigure(2, weight=0)
-        self.root.grid_columnconfigure(3, weight=0)
+        for column in range(1, 10):
+            self.root.grid_columnconfigure(column, weight=0)
 
-    def start_send_message(self):
-        # Start the send_message function in a new thread
-        if self.ollama_thread and self.ollama_thread.is_alive():
-            messagebox.showinfo("Info", "Please wait for the current request to finish.")
-        else:
-            self.ollama_thread = threading.Thread(target=self.send_message, daemon=True)
-            self.ollama_thread.start()
+        # Bind ESC to stop the running request of the selected tab
+        self.root.bind("<Escape>", self.cancel_request)
 
-    def send_message(self):
-        # read user input
+    @property
+    def session(self) -> ChatSession:
+        """The conversation of the selected tab."""
+        return self.sessions[self.notebook.index("current")]
+
+    @property
+    def ollama(self) -> "Ollama":
+        return self.session.ollama
+
+    def ensure_backend(self):
+        """Import Ollama.py and set up the session store and the model list (once, from any thread)."""
+        with self._backend_lock:
+            if self.catalog is not None:
+                return
+            load_backend()
+            self.store = SessionStore(SESSION_DB)
+            self.scheduler = RequestScheduler.for_url(DEFAULT_BASE_URL)
+            self.catalog = ModelCatalog(OllamaClient(DEFAULT_BASE_URL))
+            self.catalog.on_refresh(lambda models: self.ui.call(self.update_model_list, models))
+
+    def ensure_knowledge(self) -> "KnowledgeBase":
+        """Open the document index (imports VectorIndex.py, and NumPy if installed, on first use)."""
+        self.ensure_backend()
+        with self._backend_lock:
+            if self.knowledge is None:
+                from VectorIndex import VectorIndex, KnowledgeBase
+                # indexing documents and the history runs in the background of the chats
+                client = OllamaClient(DEFAULT_BASE_URL, scheduler=self.scheduler)
+                self.knowledge = KnowledgeBase(client, VectorIndex(DOCUMENT_INDEX), EMBED_MODEL,
+                                               indexing_client=client.with_priority(BACKGROUND))
+            return self.knowledge
+
+    def start_backend(self, session:ChatSession):
+        # runs in a background thread right after the first paint
+        try:
+            self.ensure_backend()
+            self.catalog.refresh_in_background()
+            # fetch the model list and keep the model loaded while the window is open
+            warm_up_model(session.ollama, self.ui)
+        except Exception as e:
+            self.ui.call(messagebox.showerror, "Error", f"Could not start: {str(e)}")
+
+    def new_tab(self, model:str=None) -> ChatSession:
+        session = ChatSession(self, model or (self.session.current_model if self.sessions else DEFAULT_MODEL),
+                              self.next_tab_number)
+        self.next_tab_number += 1
+        self.sessions.append(session)
+        self.notebook.add(session.frame, text=session.title)
+        self.notebook.select(session.frame)
+        if len(self.sessions) > 1:
+            warm_up_model(session.ollama, self.ui)
+        return session
+
+    def close_tab(self):
+        if len(self.sessions) == 1:
+            return
+        session = self.session
+        session.cancel_request()
+        self.sessions.remove(session)
+        self.notebook.forget(session.frame)
+        session.frame.destroy()
+        # a tab without client never loaded its model; another tab with the same model keeps it loaded
+        if session.started and all(other.current_model != session.current_model for other in self.sessions):
+            threading.Thread(target=release_model, args=(session.ollama,), daemon=True).start()
+
+    def update_tab(self, session:ChatSession):
+        if session in self.sessions:
+            self.notebook.tab(session.frame, text=session.title)
+
+    def tab_changed(self, event=None):
+        self.update_status(self.session.last_record)
+
+    def session_recorded(self, session:ChatSession, record:dict):
+        session.last_record = record
+        if session is self.session:
+            self.update_status(record)
+
+    def start_send_message(self):
+        # read user input on the Tk thread
         user_input = self.input_field.get("1.0", END).strip()
-        if not user_input.strip():
+        if not user_input:
             messagebox.showwarning("Warning", "Input field cannot be empty.")
             return
-        # request from Ollama
-        try:
-            # call Ollama API
-            response = self.ollama.chat(user_input)
-            # write/move user_input to chat history window
-            self.chat_history.insert(tk.END, f"{user_input}\n", "user_color")
-            self.chat_history.tag_config("user_color", foreground="white")
-            # write LLM response to chat history window
-            self.chat_history.insert(tk.END, f"{response}\n\n", "assistant_color")
-            self.chat_history.tag_config("assistant_color", foreground="#87CEEB")
-            # store the response
-            self.last_response = response  
-        except Exception as e:
-            messagebox.showerror("Error", f"An error occurred: {str(e)}")
-        # remove content from input_field
-        self.input_field.delete("1.0", END)
+        if self.session.busy():
+            messagebox.showinfo("Info", "Please wait for the current request of this tab to finish or open a new tab.")
+        else:
+            # remove content from input_field
+            self.input_field.delete("1.0", END)
+            self.session.start_send_message(user_input, self.use_documents.get())
 
-    def cancel_request(self):
-        # Set the cancellation event to stop the ongoing request
-        self.cancel_event.set()
+    def cancel_request(self, event=None):
+        self.session.cancel_request()
 
     def enter_pressed_callback(self, event):
         if event.state == 0:  # only send_message if ENTER is not modified by other keys (e.g ALT+ENTER)
-            self.send_message()
+            self.start_send_message()
             return 'break'  # prevent tkinter to add a newline due to enter 
 
     def copy_to_clipboard(self):
         self.root.clipboard_clear()
-        self.root.clipboard_append(self.last_response)
+        self.root.clipboard_append(self.session.last_response)
         # messagebox.showinfo("Info", "Last response copied to clipboard.")
 
     def open_config_window(self):
+        self.ensure_backend()
         config_window = tk.Toplevel(self.root)
         config_window.title("Config")
 
-        available_models = self.ollama.list_models()
+        # show the cached model list right away, a stale list is refreshed in the background
+        available_models = self.catalog.cached()
+        if self.catalog.is_stale():
+            self.catalog.refresh_in_background()
 
         tk.Label(config_window, text="Selected Model:").grid(row=0, column=0, padx=10, pady=10)
         
         self.model_var = tk.StringVar(value=self.ollama.model)
-        model_dropdown = ttk.Combobox(config_window, textvariable=self.model_var, values=available_models)
-        model_dropdown.grid(row=0, column=1, padx=10, pady=10)
+        self.model_dropdown = ttk.Combobox(config_window, textvariable=self.model_var, values=available_models)
+        self.model_dropdown.grid(row=0, column=1, padx=10, pady=10)
 
         apply_button = tk.Button(config_window, text="Apply", command=self.apply_model_selection)
         apply_button.grid(row=1, column=0, columnspan=2, padx=10, pady=10)
 
+        # rolling request timings of this session
+        tk.Label(config_window, text=self.metrics_summary(), justify=tk.LEFT, font=("Courier", 10)).grid(
+            row=2, column=0, columnspan=2, padx=10, pady=10, sticky="w")
+        tk.Button(config_window, text="Export CSV", command=self.export_metrics_csv).grid(row=3, column=0, padx=10, pady=10)
+        tk.Button(config_window, text="Export Prometheus", command=self.export_metrics_prometheus).grid(row=3, column=1, padx=10, pady=10)
+
+    def update_status(self, record:dict):
+        if record is None:
+            self.status_var.set("")
+            return
+        ttft = self.ollama.metrics.summary("ttft")
+        self.status_var.set(f"{record['model']}  |  first token {record['ttft']:.2f} s  |  "
+                            f"{record['tokens_per_second']:.1f} tokens/s  |  prompt eval {record['prompt_eval']:.2f} s "
+                            f"({record['prompt_tokens']} tokens)  |  load {record['load']:.2f} s  |  "
+                            f"total {record['total']:.2f} s  |  first token p50 {ttft['p50']:.2f} s, "
+                            f"p95 {ttft['p95']:.2f} s over {ttft['count']} requests")
+
+    def metrics_summary(self) -> str:
+        lines = [f"{'':<22}{'last':>8}{'p50':>8}{'p95':>8}{'mean':>8}"]
+        for field, label in (("ttft", "first token [s]"), ("total", "request [s]"), ("load", "model load [s]"),
+                             ("prompt_eval", "prompt eval [s]"), ("tokens_per_second", "tokens/s (server)"),
+                             ("client_tokens_per_second", "tokens/s (client)")):
+            s = self.ollama.metrics.summary(field)
+            lines.append(f"{label:<22}{s['last']:>8.2f}{s['p50']:>8.2f}{s['p95']:>8.2f}{s['mean']:>8.2f}")
+        return "\n".join(lines)
+
+    def export_metrics_csv(self):
+        if path := filedialog.asksaveasfilename(defaultextension=".csv", filetypes=[("CSV", "*.csv")]):
+            with open(path, "w", newline="", encoding="utf-8") as file:
+                self.ollama.metrics.write_csv(file)
+
+    def export_metrics_prometheus(self):
+        if path := filedialog.asksaveasfilename(defaultextension=".prom", filetypes=[("Prometheus text", "*.prom")]):
+            with open(path, "w", encoding="utf-8") as file:
+                file.write(self.ollama.metrics.prometheus())
+
+    def open_compare_window(self):
+        self.ensure_backend()
+        compare_window = tk.Toplevel(self.root)
+        compare_window.title("Compare models")
+        compare_window.configure(bg='#2E2E2E')
+        cancel = CancelToken()
+
+        available_models = self.catalog.cached()
+        if self.catalog.is_stale():
+            self.catalog.refresh_in_background()
+
+        model_list = self.compare_model_list = tk.Listbox(compare_window, selectmode=tk.MULTIPLE,
+                                                          exportselection=False, height=6)
+        for model in available_models:
+            model_list.insert(tk.END, model)
+        model_list.grid(row=0, column=0, rowspan=2, padx=10, pady=10, sticky="nsew")
+        prompt_field = scrolledtext.ScrolledText(compare_window, width=60, height=6, wrap=tk.WORD,
+                                                 bg='#1E1E1E', fg='#D3D3D3', insertbackground='white')
+        prompt_field.grid(row=0, column=1, rowspan=2, padx=10, pady=10, sticky="nsew")
+        tk.Label(compare_window, text="VRAM [GB]:", bg='#2E2E2E', fg='#D3D3D3').grid(row=0, column=2, padx=10, pady=10)
+        vram_var = tk.StringVar(value="")  # empty: as much as the currently loaded models use
+        tk.Entry(compare_window, textvariable=vram_var, width=6).grid(row=0, column=3, padx=10, pady=10)
+        panes = tk.Frame(compare_window, bg='#2E2E2E')
+        panes.grid(row=2, column=0, columnspan=6, padx=10, pady=10, sticky="nsew")
+        compare_window.grid_rowconfigure(2, weight=1)
+        compare_window.grid_columnconfigure(1, weight=1)
+
+        def run():
+            nonlocal cancel
+            models = [model_list.get(i) for i in model_list.curselection()]
+            prompt = prompt_field.get("1.0", END).strip()
+            if not models or not prompt:
+                messagebox.showwarning("Warning", "Select at least one model and enter a prompt.", parent=compare_window)
+                return
+            try:
+                vram_budget = float(vram_var.get()) * 1e9 if vram_var.get().strip() else None
+            except ValueError:
+                messagebox.showwarning("Warning", "VRAM must be a number of GB.", parent=compare_window)
+                return
+            cancel.cancel()
+            cancel = CancelToken()
+
+            # one pane per model, answers stream in side by side
+            for child in panes.winfo_children():
+                child.destroy()
+            headers, outputs = {}, {}
+            for column, model in enumerate(models):
+                headers[model] = tk.Label(panes, text=model, anchor="w", justify=tk.LEFT, bg='#2E2E2E', fg='#D3D3D3')
+                headers[model].grid(row=0, column=column, padx=5, sticky="ew")
+                outputs[model] = scrolledtext.ScrolledText(panes, width=40, height=20, wrap=tk.WORD,
+                                                           bg='#1E1E1E', fg='#D3D3D3', insertbackground='white')
+                outputs[model].tag_config("assistant_color", foreground="#87CEEB")
+                outputs[model].grid(row=1, column=column, padx=5, pady=5, sticky="nsew")
+                panes.grid_columnconfigure(column, weight=1)
+            panes.grid_rowconfigure(1, weight=1)
+
+            def show_results(results:dict):
+                for model, result in results.items():
+                    if not headers[model].winfo_exists():
+                        return
+                    if "error" in result:
+                        headers[model].configure(text=f"{model}: {result['error']}")
+                    else:
+                        headers[model].configure(text=f"{model}\nfirst token {result['ttft']:.2f} s  |  "
+                                                      f"{result['tokens_per_second']:.1f} tokens/s  |  total {result['total']:.2f} s")
+
+            def compare(ollama:"Ollama", token:"CancelToken"):
+                try:
+                    results = ollama.compare(prompt, models, vram_budget=vram_budget, cancel=token,
+                                             on_token=lambda model, text: self.ui.insert(outputs[model], text, "assistant_color"))
+                except Exception as e:
+                    self.ui.call(messagebox.showerror, "Error", f"An error occurred: {str(e)}")
+                    return
+                self.ui.call(show_results, results)
+
+            # the selected tab's system prompt and options apply, its conversation is left alone
+            threading.Thread(target=compare, args=(self.ollama, cancel), daemon=True).start()
+
+        def close():
+            cancel.cancel()
+            compare_window.destroy()
+
+        tk.Button(compare_window, text="Run", command=run, bg='#6D8764', fg='white').grid(row=0, column=4, padx=10, pady=10, sticky="nsew")
+        tk.Button(compare_window, text="Stop", command=lambda: cancel.cancel(), bg='#6D8764', fg='white').grid(row=0, column=5, padx=10, pady=10, sticky="nsew")
+        compare_window.protocol("WM_DELETE_WINDOW", close)
+
+    def open_documents_window(self):
+        knowledge = self.ensure_knowledge()
+        documents_window = tk.Toplevel(self.root)
+        documents_window.title("Documents")
+
+        status_var = tk.StringVar()
+        def show_status(text:str=""):
+            status_var.set(f"{len(knowledge.index)} chunks indexed with {knowledge.model}" + (f"  -  {text}" if text else ""))
+        show_status()
+        tk.Label(documents_window, textvariable=status_var, anchor="w").grid(row=0, column=0, columnspan=3, padx=10, pady=10, sticky="ew")
+        tk.Checkbutton(documents_window, text="Use documents for answers", variable=self.use_documents).grid(
+            row=1, column=0, columnspan=3, padx=10, pady=10, sticky="w")
+
+        def index_in_background(task, *args):
+            # embedding runs in a worker thread, progress is shown through the dispatcher
+            def run():
+                try:
+                    count = task(*args)
+                    self.ui.call(show_status, f"{count} chunks added")
+                except Exception as e:
+                    self.ui.call(show_status, "indexing failed")
+                    self.ui.call(messagebox.showerror, "Error", f"An error occurred: {str(e)}")
+            show_status("indexing ...")
+            threading.Thread(target=run, daemon=True).start()
+
+        def add_files(paths):
+            count = 0
+            for path in paths:
+                count += knowledge.add_file(path)
+                self.ui.call(show_status, f"indexed {os.path.basename(path)}")
+            return count
+
+        def add_history():
+            # continue after the newest indexed message, page by page
+            count, last_id = 0, knowledge.last_message_id()
+            while messages := self.store.all_messages(after_id=last_id, limit=200):
+                count += knowledge.add_messages(messages)
+                last_id = messages[-1]["id"]
+            return count
+
+        def choose_files():
+            if paths := filedialog.askopenfilenames(parent=documents_window, filetypes=[("Text", "*.txt *.md *.py *.csv *.json"), ("All files", "*")]):
+                index_in_background(add_files, paths)
+
+        tk.Button(documents_window, text="Add files", command=choose_files).grid(row=2, column=0, padx=10, pady=10)
+        tk.Button(documents_window, text="Index chat history", command=lambda: index_in_background(add_history)).grid(row=2, column=1, padx=10, pady=10)
+
+    def open_history_window(self):
+        self.ensure_backend()
+        history_window = tk.Toplevel(self.root)
+        history_window.title("History")
+
+        search_var = tk.StringVar()
+        search_entry = tk.Entry(history_window, textvariable=search_var)
+        search_entry.grid(row=0, column=0, padx=10, pady=10, sticky="nsew")
+        session_list = tk.Listbox(history_window, width=80, height=20)
+        session_list.grid(row=1, column=0, columnspan=3, padx=10, pady=10, sticky="nsew")
+        session_ids = []  # session id per listbox row
+
+        def show_sessions(offset=0):
+            # sessions are fetched page by page, "More" appends the next page
+            if offset == 0:
+                session_list.delete(0, tk.END)
+                session_ids.clear()
+            for session in self.store.sessions(limit=HISTORY_PAGE_SIZE, offset=offset):
+                created = time.strftime("%Y-%m-%d %H:%M", time.localtime(session["created"]))
+                session_list.insert(tk.END, f"{created}  [{session['model']}]  {session['title'] or ''}")
+                session_ids.append(session["id"])
+
+        def search(event=None):
+            query = search_var.get().strip()
+            if not query:
+                show_sessions()
+                return
+            session_list.delete(0, tk.END)
+            session_ids.clear()
+            for hit in self.store.search(query):
+                session_list.insert(tk.END, f"{hit['role']}: {hit['snippet']}")
+                session_ids.append(hit["session_id"])
+
+        def open_selected(event=None):
+            if selection := session_list.curselection():
+                self.load_session(session_ids[selection[0]])
+                history_window.destroy()
+
+        search_entry.bind("<Return>", search)
+        session_list.bind("<Double-Button-1>", open_selected)
+        tk.Button(history_window, text="Search", command=search).grid(row=0, column=1, padx=10, pady=10)
+        tk.Button(history_window, text="More", command=lambda: show_sessions(len(session_ids))).grid(row=0, column=2, padx=10, pady=10)
+        tk.Button(history_window, text="Open", command=open_selected).grid(row=2, column=0, columnspan=3, padx=10, pady=10)
+        show_sessions()
+
+    def load_session(self, session_id:int):
+        # a busy tab keeps streaming, the stored session opens in a new tab then
+        session = self.new_tab() if self.session.busy() else self.session
+        session.load_session(session_id)
+        self.update_tab(session)
+
+    def update_model_list(self, models:list):
+        if self.model_dropdown is not None and self.model_dropdown.winfo_exists():
+            self.model_dropdown.configure(values=models)
+        if self.compare_model_list is not None and self.compare_model_list.winfo_exists():
+            # keep the selected models selected
+            model_list = self.compare_model_list
+            selected = {model_list.get(i) for i in model_list.curselection()}
+            model_list.delete(0, tk.END)
+            for index, model in enumerate(models):
+                model_list.insert(tk.END, model)
+                if model in selected:
+                    model_list.selection_set(index)
+
     def apply_model_selection(self):
         selected_model = self.model_var.get()
+        session = self.session
+        old_model = session.current_model
+        released = session.started and old_model != selected_model
         self.ollama.model = selected_model
+        self.update_tab(session)
+        warm_up_model(self.ollama, self.ui)
+        # the old model was pinned by this tab, unless another tab still chats with it
+        if released and all(other.current_model != old_model for other in self.sessions):
+            threading.Thread(target=release_model, args=(self.ollama, old_model), daemon=True).start()
         messagebox.showinfo("Info", f"Model changed to {selected_model}")
 
     def run(self):
-        self.root.mainloop()
+        # show the window first, the backend is set up in the background once Tk is idle
+        session = self.sessions[0]
+        self.root.after_idle(lambda: threading.Thread(target=self.start_backend, args=(session,), daemon=True).start())
+        try:
+            self.root.mainloop()
+        finally:
+            self.ui.close()
+            # stop running answers first, else a release can queue behind their generation
+            for session in self.sessions:
+                session.cancel_request()
+            # one release per distinct model, tabs that never sent anything have no client
+            started = [session for session in self.sessions if session.started]
+            releases = [threading.Thread(target=release_model, args=(session.ollama,), daemon=True)
+                        for session in {session.ollama.model: session for session in started}.values()]
+            for thread in releases:
+                thread.start()
+            deadline = time.monotonic() + RELEASE_TIMEOUT
+            for thread in releases:
+                thread.join(max(0.0, deadline - time.monotonic()))
+            if self.store is not None:
+                self.store.close()
+            if self.knowledge is not None:
+                self.knowledge.index.close()
 
 
 #----------------------------------------------
@@ -129,8 +960,9 @@ class ChatApp:
 
 class AsyncChatApp:
     def __init__(self):
+        load_backend()
         # model instance
-        self.ollama = Ollama(model="llama3")
+        self.ollama = Ollama(model="llama3", keep_alive=KEEP_ALIVE_OPEN)
 
         # Main GUI window
         self.root = tk.Tk()
@@ -146,7 +978,11 @@ class AsyncChatApp:
         # Chat history
         self.chat_history = scrolledtext.ScrolledText(self.root, width=60, height=20, wrap=tk.WORD,
                                                       bg='#1E1E1E', fg='#D3D3D3', insertbackground='white')
-        self.chat_history.grid(row=0, column=0, columnspan=3, padx=10, pady=10, sticky="nsew")
+        self.chat_history.grid(row=0, column=0, columnspan=4, padx=10, pady=10, sticky="nsew")
+        self.chat_history.tag_config("user_color", foreground="white")
+        self.chat_history.tag_config("assistant_color", foreground="#87CEEB")
+        self.history = VirtualHistoryView(self.chat_history)
+        self.ui = UIDispatcher(self.root)  # thread-safe, batched updates of the chat history
 
         # User input
         self.input_field = scrolledtext.ScrolledText(self.root, width=40, height=4, wrap=tk.WORD,
@@ -162,21 +998,26 @@ class AsyncChatApp:
         self.copy_button = tk.Button(self.root, text="Copy answer", command=self.copy_to_clipboard, bg='#6D8764', fg='white')
         self.copy_button.grid(row=1, column=2, padx=10, pady=10, sticky="nsew")
 
+        # Stop button
+        self.stop_button = tk.Button(self.root, text="Stop", command=self.stop_streaming, bg='#6D8764', fg='white')
+        self.stop_button.grid(row=1, column=3, padx=10, pady=10, sticky="nsew")
+
         # Grid configuration to make widgets resize with the window
         self.root.grid_rowconfigure(0, weight=1)
         self.root.grid_rowconfigure(1, weight=0)
         self.root.grid_columnconfigure(0, weight=1)
         self.root.grid_columnconfigure(1, weight=0)
         self.root.grid_columnconfigure(2, weight=0)
+        self.root.grid_columnconfigure(3, weight=0)
 
         self.last_response = ""
-        self.stop_event = Event()
+        self.cancel_token = CancelToken()
 
         # Bind ESC to stop streaming
         self.root.bind("<Escape>", self.stop_streaming)
 
-        # Periodically call the asyncio event loop
-        self.root.after(100, self.run_asyncio_loop)
+        # asyncio runs on its own thread, tokens are handed back through self.ui
+        self.asyncio_thread = AsyncioThread()
 
     def send_message(self):
         user_input = self.input_field.get("1.0", tk.END).strip()
@@ -184,22 +1025,19 @@ class AsyncChatApp:
             messagebox.showwarning("Warning", "Input field cannot be empty.")
             return
 
-        self.chat_history.insert(tk.END, f"{user_input}\n", "user_color")
-        self.chat_history.tag_config("user_color", foreground="white")
+        self.history.insert(tk.END, f"{user_input}\n", "user_color")
+        self.history.see(tk.END)
         self.input_field.delete("1.0", tk.END)
 
-        self.stop_event.clear()
-        asyncio.ensure_future(self.handle_response(user_input))
-        self.chat_history.insert(tk.END, "\n", "assistant_color")
-        self.chat_history.tag_config("assistant_color", foreground="#87CEEB")
+        self.cancel_token = CancelToken()
+        future = self.asyncio_thread.submit(self.handle_response(user_input, self.cancel_token))
+        future.add_done_callback(self.response_done_callback)
+        self.history.insert(tk.END, "\n", "assistant_color")
 
-    async def handle_response(self, user_input):
+    async def handle_response(self, user_input, cancel:"CancelToken"):
         self.last_response = ""
-        async for response in self.ollama.achat(prompt=user_input, stream=True):
-            if self.stop_event.is_set():
-                break
-            self.chat_history.insert(tk.END, f"{response}", "assistant_color")
-            self.chat_history.tag_config("assistant_color", foreground="#87CEEB")
+        async for response in self.ollama.achat(prompt=user_input, stream=True, cancel=cancel):
+            self.ui.insert(self.history, response, "assistant_color")
             self.last_response += response
 
     def enter_pressed_callback(self, event):
@@ -212,26 +1050,27 @@ class AsyncChatApp:
         self.root.clipboard_append(self.last_response)
         # messagebox.showinfo("Info", "Last response copied to clipboard.")
 
-    def stop_streaming(self, event):
-        self.stop_event.set()
+    def response_done_callback(self, future):
+        if not future.cancelled() and (e := future.exception()):
+            self.ui.call(messagebox.showerror, "Error", f"An error occurred: {str(e)}")
 
-    def run_asyncio_loop(self):
-        try:
-            loop = asyncio.get_event_loop()
-            loop.run_until_complete(asyncio.sleep(0))
-        except RuntimeError:
-            new_loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(new_loop)
-            loop = new_loop
-
-        self.root.after(100, self.run_asyncio_loop)
+    def stop_streaming(self, event=None):
+        # aborts the connection of the running request (thread-safe)
+        self.cancel_token.cancel()
 
     def run(self):
-        self.root.mainloop()
+        # keep the model loaded while the window is open
+        warm_up_model(self.ollama, self.ui)
+        try:
+            self.root.mainloop()
+        finally:
+            self.ui.close()
+            self.asyncio_thread.stop()
+            release_model(self.ollama)
 
 
 if __name__ == "__main__":
     app = ChatApp()
     app.run()
     # app = AsyncChatApp()
-    # asyncio.run(app.run())
\ No newline at end of file
+    # app.run()
\ No newline at end of file
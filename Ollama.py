@@ -1,17 +1,591 @@
-import requests as re
 import json
 import http.client
+import argparse
 import asyncio
+import concurrent.futures
+import contextlib
+import copy
+import csv
+import hashlib
+import heapq
+import itertools
+import os
+import select
+import socket
+import sqlite3
+import sys
+import threading
+import time
+import weakref
+from collections import OrderedDict, deque
+from collections.abc import Mapping
 from urllib.parse import urlparse
 
+try:
+    import orjson
+except ImportError:  # optional, request bodies are encoded with the json module then
+    orjson = None
+
+
+class RequestCancelled(Exception):
+    """Raised when a request was aborted through its CancelToken."""
+
+
+class ResponseError(AssertionError):
+    """Raised for a response with another HTTP status than 200 (an AssertionError for existing callers)."""
+    def __init__(self, status: int) -> None:
+        super().__init__(f"Ollama Server returns http status code: {status}")
+        self.status = status
+
+
+class CancelToken:
+    """Cancels in-flight requests from any thread.
+
+    Clients register an abort callback for the connection a request runs on; cancel() calls them,
+    which closes the socket so the server stops generating and frees its slot.
+    """
+    def __init__(self) -> None:
+        self.cancelled = False
+        self._callbacks = {}
+        self._lock = threading.Lock()
+
+    def cancel(self) -> None:
+        with self._lock:
+            if self.cancelled:
+                return
+            self.cancelled = True
+            callbacks, self._callbacks = list(self._callbacks.values()), {}
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:
+                pass
+
+    def register(self, callback):
+        """Call callback on cancel() (right away if already cancelled); returns a function to unregister it."""
+        key = object()
+        with self._lock:
+            if not self.cancelled:
+                self._callbacks[key] = callback
+                return lambda: self._callbacks.pop(key, None)
+        callback()
+        return lambda: None
+
+
+def _abort_connection(connection: http.client.HTTPConnection) -> None:
+    # shutdown (unlike close) also wakes up a thread that is blocked reading from the socket
+    if (sock := connection.sock) is not None:
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+
+_STALE_ERRORS = (http.client.RemoteDisconnected, http.client.BadStatusLine, ConnectionResetError,
+                 ConnectionAbortedError, BrokenPipeError)
+
+
+_POOL_TIMEOUT = object()  # request() default: the pool's timeout
+
+
+class ConnectionPool:
+    """Bounded pool of keep-alive HTTP connections to one Ollama server, shared per base_url.
+
+    timeout is the socket timeout of requests that do not pass their own; clients sharing the
+    pool pass theirs with every request.
+    """
+    _pools = {}
+    _pools_lock = threading.Lock()
+
+    def __init__(self, base_url: str, maxsize: int = 4, idle_timeout: float = 60.0, timeout: float = None) -> None:
+        self.base_url = base_url
+        self.maxsize = maxsize
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self._netloc = urlparse(base_url).netloc
+        self._idle = []  # (connection, last_used) pairs, most recently used last
+        self._lock = threading.Lock()
+        self._slots = threading.Semaphore(maxsize)
+        self._cancel_hooks = {}  # id(connection) -> unregister function of its CancelToken callback
+
+    @classmethod
+    def for_url(cls, base_url: str, **kwargs) -> "ConnectionPool":
+        """The shared pool of base_url; an existing pool grows to maxsize but keeps its other settings."""
+        with cls._pools_lock:
+            if (pool := cls._pools.get(base_url)) is None:
+                pool = cls._pools[base_url] = cls(base_url, **kwargs)
+                return pool
+        if "maxsize" in kwargs:
+            pool.ensure_size(kwargs["maxsize"])
+        return pool
+
+    def ensure_size(self, maxsize: int) -> None:
+        """Grow the pool so that at least maxsize connections can be in use at once."""
+        with self._lock:
+            for _ in range(maxsize - self.maxsize):
+                self._slots.release()
+            self.maxsize = max(self.maxsize, maxsize)
+
+    def _new_connection(self) -> http.client.HTTPConnection:
+        return http.client.HTTPConnection(self._netloc, timeout=self.timeout)
+
+    @staticmethod
+    def _is_healthy(connection: http.client.HTTPConnection) -> bool:
+        # an idle keep-alive socket must not be readable; if it is the server closed it (or sent garbage)
+        if connection.sock is None:
+            return False
+        try:
+            readable, _, _ = select.select([connection.sock], [], [], 0)
+        except (OSError, ValueError):
+            return False
+        return not readable
+
+    def acquire(self) -> tuple:
+        """Borrow a connection, blocking while all maxsize connections are in use. Returns (connection, reused)."""
+        self._slots.acquire()
+        now = time.monotonic()
+        with self._lock:
+            self._evict_idle(now)
+            while self._idle:
+                connection, _ = self._idle.pop()
+                if self._is_healthy(connection):
+                    return connection, True
+                connection.close()
+        return self._new_connection(), False
+
+    def release(self, connection: http.client.HTTPConnection, response: http.client.HTTPResponse = None) -> None:
+        """Return a connection; it is only kept alive if its last response was read completely."""
+        self._unwatch(connection)
+        reusable = connection.sock is not None and (response is None or (response.isclosed() and not response.will_close))
+        with self._lock:
+            if reusable:
+                self._idle.append((connection, time.monotonic()))
+            else:
+                connection.close()
+        self._slots.release()
+
+    def _evict_idle(self, now: float) -> None:
+        keep = []
+        for connection, last_used in self._idle:
+            if now - last_used > self.idle_timeout:
+                connection.close()
+            else:
+                keep.append((connection, last_used))
+        self._idle = keep
+
+    def _watch(self, connection: http.client.HTTPConnection, cancel: CancelToken) -> None:
+        if cancel is not None:
+            self._cancel_hooks[id(connection)] = cancel.register(lambda: _abort_connection(connection))
+
+    def _unwatch(self, connection: http.client.HTTPConnection) -> None:
+        if (unregister := self._cancel_hooks.pop(id(connection), None)) is not None:
+            unregister()
+
+    def request(self, method: str, path: str, body: bytes = None, headers: dict = None,
+                cancel: CancelToken = None, timeout: float = _POOL_TIMEOUT) -> tuple:
+        """Send a request on a pooled connection and return (connection, response).
+
+        A reused keep-alive socket that turns out to be stale is retried once on a fresh connection.
+        With a CancelToken the socket is shut down on cancel() until the connection is released.
+        The caller must hand the connection back with release() after consuming the response.
+        """
+        if timeout is _POOL_TIMEOUT:
+            timeout = self.timeout
+        connection, reused = self.acquire()
+        while True:
+            try:
+                if cancel is not None and cancel.cancelled:
+                    raise RequestCancelled()
+                # the connection may have been opened for a client with another timeout
+                connection.timeout = timeout
+                if connection.sock is None:
+                    connection.connect()
+                else:
+                    connection.sock.settimeout(timeout)
+                self._watch(connection, cancel)
+                connection.request(method, path, body, headers or {})
+                response = connection.getresponse()
+                if cancel is not None and cancel.cancelled:
+                    raise RequestCancelled()
+                return connection, response
+            except _STALE_ERRORS:
+                self._unwatch(connection)
+                connection.close()
+                if cancel is not None and cancel.cancelled:
+                    self._slots.release()
+                    raise RequestCancelled() from None
+                if not reused:
+                    self._slots.release()
+                    raise
+                connection, reused = self._new_connection(), False
+            except BaseException as e:
+                self._unwatch(connection)
+                connection.close()
+                self._slots.release()
+                if cancel is not None and cancel.cancelled and not isinstance(e, RequestCancelled):
+                    raise RequestCancelled() from None
+                raise
+
+    def close(self) -> None:
+        with self._lock:
+            for connection, _ in self._idle:
+                connection.close()
+            self._idle = []
+
+
+INTERACTIVE = 0  # request priorities of the RequestScheduler, lower runs first
+BACKGROUND = 1
+
+
+class RequestScheduler:
+    """Client side queue for the model requests of one Ollama server, shared per base_url.
+
+    The server runs at most OLLAMA_NUM_PARALLEL requests per model and queues the rest in arrival
+    order, so a burst of background requests delays an interactive one. Here at most max_parallel
+    requests per model are in flight, waiting requests are admitted by priority (INTERACTIVE before
+    BACKGROUND, then in arrival order) and background requests leave reserve_interactive of the
+    slots free, so an interactive request never waits behind more than the ones already running.
+    """
+    _schedulers = {}
+    _schedulers_lock = threading.Lock()
+
+    def __init__(self, max_parallel: int = None, reserve_interactive: int = 1) -> None:
+        # the server's default for OLLAMA_NUM_PARALLEL is 4 (or 1 on low memory)
+        self.max_parallel = max_parallel or int(os.environ.get("OLLAMA_NUM_PARALLEL") or 4)
+        self.reserve_interactive = max(0, min(reserve_interactive, self.max_parallel - 1))
+        self._running = {}  # model -> requests in flight
+        self._waiting = {}  # model -> heap of (priority, arrival)
+        self._arrivals = itertools.count()
+        self._condition = threading.Condition()
+
+    @classmethod
+    def for_url(cls, base_url: str, **kwargs) -> "RequestScheduler":
+        with cls._schedulers_lock:
+            if (scheduler := cls._schedulers.get(base_url)) is None:
+                scheduler = cls._schedulers[base_url] = cls(**kwargs)
+            return scheduler
+
+    def _limit(self, priority: int) -> int:
+        return self.max_parallel if priority <= INTERACTIVE else self.max_parallel - self.reserve_interactive
+
+    def _wake(self) -> None:
+        with self._condition:
+            self._condition.notify_all()
+
+    def acquire(self, model: str, priority: int = INTERACTIVE, cancel: CancelToken = None) -> None:
+        """Block until a request for model may be sent; raises RequestCancelled if cancelled while waiting."""
+        model = _model_name(model)
+        entry = (priority, next(self._arrivals))
+        unregister = cancel.register(self._wake) if cancel is not None else None
+        try:
+            with self._condition:
+                waiting = self._waiting.setdefault(model, [])
+                heapq.heappush(waiting, entry)
+                while waiting[0] != entry or self._running.get(model, 0) >= self._limit(priority):
+                    if cancel is not None and cancel.cancelled:
+                        waiting.remove(entry)
+                        heapq.heapify(waiting)
+                        self._condition.notify_all()
+                        raise RequestCancelled()
+                    self._condition.wait()
+                heapq.heappop(waiting)
+                self._running[model] = self._running.get(model, 0) + 1
+                self._condition.notify_all()  # the next waiter may fit into another free slot
+        finally:
+            if unregister is not None:
+                unregister()
+
+    def release(self, model: str) -> None:
+        model = _model_name(model)
+        with self._condition:
+            self._running[model] -= 1
+            self._condition.notify_all()
+
+    @contextlib.contextmanager
+    def slot(self, model: str, priority: int = INTERACTIVE, cancel: CancelToken = None):
+        self.acquire(model, priority, cancel)
+        try:
+            yield
+        finally:
+            self.release(model)
+
+    def stats(self) -> dict:
+        with self._condition:
+            return {"running": {m: n for m, n in self._running.items() if n},
+                    "waiting": {m: len(w) for m, w in self._waiting.items() if w}}
+
+
+class ResponseCache:
+    """Cache for complete (non-streamed) responses, keyed on a canonical hash of the request body.
+
+    The first tier is an in-memory LRU of up to maxsize entries. With a path, responses are also
+    kept in a SQLite database that is trimmed to max_bytes (least recently used first). Entries
+    older than ttl seconds are treated as misses. By default only deterministic requests are
+    cached, i.e. requests with options temperature 0 or a fixed seed.
+    """
+    _IGNORED_KEYS = ("stream", "keep_alive")
+
+    def __init__(self, maxsize: int = 256, path: str = None, max_bytes: int = 64 * 1024 * 1024,
+                 ttl: float = None, deterministic_only: bool = True) -> None:
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.deterministic_only = deterministic_only
+        self.hits = self.misses = self.disk_hits = 0
+        self._memory = OrderedDict()  # key -> (created, response)
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, value BLOB, "
+                             "created REAL, accessed REAL, size INTEGER)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+            # running total of the stored sizes, so put() does not sum the whole table
+            self._bytes = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def cacheable(self, body: dict) -> bool:
+        if not self.deterministic_only:
+            return True
+        options = body.get("options") or {}
+        return options.get("temperature") == 0 or options.get("seed") is not None
+
+    def key(self, path: str, body: dict) -> str:
+        canonical = {k: v for k, v in body.items() if k not in self._IGNORED_KEYS}
+        data = json.dumps([path, canonical], sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=dict)
+        return hashlib.sha256(data.encode()).hexdigest()
+
+    def _expired(self, created: float, now: float) -> bool:
+        return self.ttl is not None and now - created > self.ttl
+
+    def get(self, key: str):
+        now = time.time()
+        with self._lock:
+            if (entry := self._memory.get(key)) is not None:
+                if not self._expired(entry[0], now):
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self._memory[key]
+            if self._db is not None:
+                row = self._db.execute("SELECT value, created, size FROM responses WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    if not self._expired(row[1], now):
+                        self._db.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+                        response = json.loads(row[0])
+                        self._remember(key, row[1], response)
+                        self.hits += 1
+                        self.disk_hits += 1
+                        return response
+                    self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self._bytes -= row[2]
+            self.misses += 1
+            return None
+
+    def put(self, key: str, response: dict) -> None:
+        now = time.time()
+        with self._lock:
+            self._remember(key, now, response)
+            if self._db is not None:
+                value = json.dumps(response).encode()
+                if (old := self._db.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()) is not None:
+                    self._bytes -= old[0]
+                self._db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                                 (key, value, now, now, len(value)))
+                self._bytes += len(value)
+                if self._bytes > self.max_bytes:
+                    self._trim()
+
+    def _remember(self, key: str, created: float, response: dict) -> None:
+        self._memory[key] = (created, response)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.maxsize:
+            self._memory.popitem(last=False)
+
+    def _trim(self) -> None:
+        # evict least recently used rows in small batches (via the accessed index) until under max_bytes
+        while self._bytes > self.max_bytes:
+            rows = self._db.execute("SELECT key, size FROM responses ORDER BY accessed LIMIT 16").fetchall()
+            if not rows:
+                self._bytes = 0
+                return
+            for key, size in rows:
+                self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._bytes -= size
+                if self._bytes <= self.max_bytes:
+                    return
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM responses")
+                self._bytes = 0
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "disk_hits": self.disk_hits,
+                "memory_entries": len(self._memory)}
+
+    def close(self) -> None:
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+
+def _dumps(obj) -> bytes:
+    # compact JSON, with orjson if it is installed
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj)
+        except TypeError:  # e.g. lone surrogates in text from Tk, json escapes them
+            pass
+    return json.dumps(obj, separators=(",", ":")).encode()
+
+
+class Message(Mapping):
+    """A validated chat message that keeps its JSON encoding.
+
+    A read-only mapping with role, content and any further fields of the message (e.g. images).
+    Conversations store their history as Messages, so each message is validated and serialized
+    once when it is added instead of with every request that carries it.
+    """
+    __slots__ = ("role", "content", "extra", "json")
+    ROLES = ("system", "user", "assistant")
+
+    def __init__(self, role: str, content: str, **extra) -> None:
+        if role not in self.ROLES:
+            raise ValueError('messages must contain a role and it must be one of "system", "user", or "assistant"')
+        self.role = role
+        self.content = content
+        self.extra = extra or None
+        self.json = _dumps({"role": role, "content": content, **extra})
+
+    @classmethod
+    def of(cls, message) -> "Message":
+        """message as a Message; a dict is validated and serialized, a Message is returned as is."""
+        if isinstance(message, Message):
+            return message
+        if not isinstance(message, Mapping):
+            raise TypeError("Messages must be a list of dict-like objects")
+        if "content" not in message:
+            raise ValueError("Messages must contain content")
+        extra = {key: value for key, value in message.items() if key not in ("role", "content")}
+        return cls(message.get("role"), message["content"], **extra)
+
+    def __getitem__(self, key: str):
+        if key == "role":
+            return self.role
+        if key == "content":
+            return self.content
+        if self.extra is not None and key in self.extra:
+            return self.extra[key]
+        raise KeyError(key)
+
+    def __iter__(self):
+        yield "role"
+        yield "content"
+        if self.extra is not None:
+            yield from self.extra
+
+    def __len__(self) -> int:
+        return 2 + len(self.extra or ())
+
+    def to_dict(self) -> dict:
+        return {"role": self.role, "content": self.content, **(self.extra or {})}
+
+    def __repr__(self) -> str:
+        return f"Message({self.to_dict()!r})"
+
+
+def encode_body(body: dict) -> bytes:
+    """The JSON request body; the messages of a chat body are joined from their cached encodings."""
+    messages = body.get("messages")
+    if not messages:
+        return _dumps(body)
+    head = _dumps({key: value for key, value in body.items() if key != "messages"})
+    fragments = b",".join(m.json if isinstance(m, Message) else _dumps(m) for m in messages)
+    return b"".join((head[:-1], b',"messages":[' if len(head) > 2 else b'"messages":[', fragments, b"]}"))
+
 
 class OllamaClient:
-    def __init__(self, base_url: str = "http://localhost:11434") -> None:
+    def __init__(self, base_url: str = "http://localhost:11434", timeout: float = None, cache: ResponseCache = None,
+                 scheduler: RequestScheduler = None, priority: int = INTERACTIVE) -> None:
         self.base_url = base_url
-        parsed_url = urlparse(base_url)
-        self._HTTPclient = http.client.HTTPConnection(parsed_url.netloc)
+        self.timeout = timeout  # socket timeout of this client's requests
+        self._pool = ConnectionPool.for_url(base_url)
+        self.cache = cache  # optional ResponseCache for non-streamed generate/chat requests
+        self.scheduler = scheduler  # optional RequestScheduler that queues the model requests
+        self.priority = priority  # INTERACTIVE or BACKGROUND, the class of this client's requests
+
+    def with_priority(self, priority: int) -> "OllamaClient":
+        """A client sharing this one's connections, cache and scheduler whose requests have another priority."""
+        client = copy.copy(self)
+        client.priority = priority
+        return client
+
+    def _cached_request(self, path: str, body: dict, cancel: CancelToken = None) -> dict:
+        if self.cache is None or not self.cache.cacheable(body):
+            return self._request("POST", path, body, cancel)
+        key = self.cache.key(path, body)
+        if (response := self.cache.get(key)) is None:
+            response = self._request("POST", path, body, cancel)
+            self.cache.put(key, response)
+        return response
+
+    def _scheduled(self, body: dict) -> bool:
+        return self.scheduler is not None and body is not None and "model" in body
+
+    def _request(self, method: str, path: str, body: dict = None, cancel: CancelToken = None) -> dict:
+        if self._scheduled(body):
+            with self.scheduler.slot(body["model"], self.priority, cancel):
+                return self._send(method, path, body, cancel)
+        return self._send(method, path, body, cancel)
+
+    def _send(self, method: str, path: str, body: dict = None, cancel: CancelToken = None) -> dict:
+        headers = {'Content-type': 'application/json'} if body is not None else None
+        connection, response = self._pool.request(method, path, encode_body(body) if body is not None else None,
+                                                  headers, cancel, self.timeout)
+        try:
+            data = response.read()
+        except (OSError, http.client.HTTPException):
+            if cancel is not None and cancel.cancelled:
+                raise RequestCancelled() from None
+            raise
+        finally:
+            self._pool.release(connection, response)
+        if cancel is not None and cancel.cancelled:
+            raise RequestCancelled()
+        if not response.status == 200:
+            raise ResponseError(response.status)
+        return json.loads(data)
     
-    def generate(self, model:str, prompt:str,system:str=None) -> dict:
+    def _stream(self, method: str, path: str, body: dict, cancel: CancelToken = None):
+        if self._scheduled(body):
+            with self.scheduler.slot(body["model"], self.priority, cancel):
+                yield from self._send_stream(method, path, body, cancel)
+        else:
+            yield from self._send_stream(method, path, body, cancel)
+
+    def _send_stream(self, method: str, path: str, body: dict, cancel: CancelToken = None):
+        headers = {'Content-type': 'application/json'}
+        connection, response = self._pool.request(method, path, encode_body(body), headers, cancel, self.timeout)
+        try:
+            if not response.status == 200:
+                raise ResponseError(response.status)
+            # process each line as it arrives
+            yield from iter_ndjson(response)
+        except (OSError, ValueError, http.client.HTTPException):
+            if cancel is not None and cancel.cancelled:
+                raise RequestCancelled() from None
+            raise
+        finally:
+            self._pool.release(connection, response)
+        if cancel is not None and cancel.cancelled:
+            raise RequestCancelled()
+
+    @staticmethod
+    def _generate_body(model:str, prompt:str, system:str, stream:bool, context:list=None,
+                       keep_alive=None, options:dict=None) -> dict:
         # input checks
         if not model:
             raise ValueError("No model provided.")
@@ -20,54 +594,254 @@ class OllamaClient:
         body = {
             "model": model,
             "prompt": prompt,
-            "stream": False
+            "stream": stream
         }
         if system:
-            body["system": system]
-
-        # perform API request
-        headers = {'Content-type': 'application/json'}
-        self._HTTPclient.request("POST", "/api/generate", json.dumps(body), headers)
-        response = self._HTTPclient.getresponse()
-
-        if not response.status == 200:
-            raise AssertionError(f"Ollama Server returns http status code: {response.status_code}")
-
-        return json.loads(response.read().decode())
+            body["system"] = system
+        if context:
+            body["context"] = context
+        if keep_alive is not None:
+            body["keep_alive"] = keep_alive
+        if options:
+            body["options"] = options
+        return body
 
-    def chat(self, model:str, messages:list) -> dict:
+    @staticmethod
+    def _chat_body(model:str, messages:list, stream:bool, keep_alive=None, options:dict=None) -> dict:
         # input checks
         if not model:
             raise ValueError("No model provided.")
-        for message in messages:
-            if not isinstance(message, dict):
-                raise TypeError("Messages must be a list of dict-like objects")
-            if not (role := message.get("role")) or role not in ["system", "user", "assistant"]:
-                raise ValueError('messages must contain a role and it must be one of "system", "user", or "assistant"')
-            if "content" not in message:
-                raise ValueError("Messages must contain content")
+        # Messages (e.g. a Conversation's history) were validated when they were created
+        messages = [Message.of(message) for message in messages]
 
         # prepare API body
         body = {
             "model": model,
             "messages": messages,
-            "stream": False
+            "stream": stream
         }
+        if keep_alive is not None:
+            body["keep_alive"] = keep_alive
+        if options:
+            body["options"] = options
+        return body
 
-        # perform API request
-        headers = {'Content-type': 'application/json'}
-        self._HTTPclient.request("POST", "/api/chat", json.dumps(body), headers)
-        response = self._HTTPclient.getresponse()
-        if not response.status == 200:
-            raise AssertionError(f"Ollama Server returns http status code: {response.status_code}")
-        return json.loads(response.read().decode())
+    @staticmethod
+    def _embed_bodies(model:str, input, truncate:bool=None, keep_alive=None, options:dict=None,
+                      batch_size:int=64) -> list:
+        # one /api/embed body per batch of input texts
+        if not model:
+            raise ValueError("No model provided.")
+        texts = [input] if isinstance(input, str) else list(input)
+        bodies = []
+        for start in range(0, len(texts), batch_size):
+            body = {"model": model, "input": texts[start:start + batch_size]}
+            if truncate is not None:
+                body["truncate"] = truncate
+            if keep_alive is not None:
+                body["keep_alive"] = keep_alive
+            if options:
+                body["options"] = options
+            bodies.append(body)
+        return bodies
 
-    def list_models(self) -> None:
-        self._HTTPclient.request("GET", "/api/tags")
-        response = self._HTTPclient.getresponse()
-        if not response.status == 200:
-            raise AssertionError(f"Ollama Server returns http status code: {response.status_code}")
-        return json.loads(response.read().decode())
+    # context: token context returned by a previous generate call (server side KV reuse)
+    # keep_alive: how long the model stays loaded after the request, e.g. "30m", seconds, -1 (forever) or 0 (unload)
+    # options: model parameters such as num_ctx, num_thread, temperature, seed
+    # cancel: CancelToken that aborts the request (RequestCancelled is raised)
+
+    def generate(self, model:str, prompt:str,system:str=None, context:list=None, keep_alive=None, options:dict=None,
+                 cancel:CancelToken=None) -> dict:
+        body = self._generate_body(model, prompt, system, False, context, keep_alive, options)
+        return self._cached_request("/api/generate", body, cancel)
+
+    def generate_stream(self, model:str, prompt:str, system:str=None, context:list=None, keep_alive=None, options:dict=None,
+                        cancel:CancelToken=None):
+        """Yield the partial responses of /api/generate as they arrive; the last one has done=True and the stats."""
+        body = self._generate_body(model, prompt, system, True, context, keep_alive, options)
+        yield from self._stream("POST", "/api/generate", body, cancel)
+
+    def chat(self, model:str, messages:list, keep_alive=None, options:dict=None, cancel:CancelToken=None) -> dict:
+        return self._cached_request("/api/chat", self._chat_body(model, messages, False, keep_alive, options), cancel)
+
+    def chat_stream(self, model:str, messages:list, keep_alive=None, options:dict=None, cancel:CancelToken=None):
+        """Yield the partial responses of /api/chat as they arrive; the last one has done=True and the stats."""
+        yield from self._stream("POST", "/api/chat", self._chat_body(model, messages, True, keep_alive, options), cancel)
+
+    def embed(self, model:str, input, truncate:bool=None, keep_alive=None, options:dict=None, batch_size:int=64,
+              cancel:CancelToken=None) -> dict:
+        """Embeddings of a text or a list of texts (/api/embed), sent in batches of batch_size texts.
+
+        Returns {"model": model, "embeddings": [[float, ...], ...]} in input order.
+        """
+        embeddings = []
+        for body in self._embed_bodies(model, input, truncate, keep_alive, options, batch_size):
+            embeddings.extend(self._request("POST", "/api/embed", body, cancel)["embeddings"])
+        return {"model": model, "embeddings": embeddings}
+
+    def load_model(self, model:str, keep_alive=None, messages:list=None, options:dict=None) -> dict:
+        """Load a model into memory without generating (an empty generate request).
+
+        With messages (e.g. the system prompt of a new session) the model also evaluates them and
+        generates a single token, so the server has their prefix in its KV cache when the first
+        real request with the same messages arrives. Never answered from the cache.
+        """
+        if messages:
+            options = dict(options or {}, num_predict=1)
+            return self._request("POST", "/api/chat", self._chat_body(model, messages, False, keep_alive, options))
+        return self.generate(model, "", keep_alive=keep_alive)
+
+    def list_models(self) -> dict:
+        return self._request("GET", "/api/tags")
+
+    def list_running_models(self) -> dict:
+        return self._request("GET", "/api/ps")
+
+
+def _model_name(name: str) -> str:
+    return name.split(":latest")[0]
+
+
+class _Backend:
+    def __init__(self, client: OllamaClient) -> None:
+        self.client = client
+        self.models = set()  # installed models (/api/tags)
+        self.loaded = set()  # models currently in memory (/api/ps)
+        self.outstanding = 0
+        self.failed_until = 0.0
+
+
+class OllamaRouter:
+    """Client side load balancer over several Ollama servers with the OllamaClient interface.
+
+    Requests for a model go to a healthy server that has it installed, preferring servers that
+    already have it loaded and then the one with the fewest outstanding requests. A server that
+    fails (connection error, timeout or 5xx response) is skipped for retry_after seconds and the
+    request fails over to the next candidate; a 4xx response is the request's fault and is raised
+    right away. Streams only fail over as long as nothing has been yielded yet.
+    """
+    _FAILURES = (OSError, ResponseError, http.client.HTTPException)  # RequestCancelled is not a failure
+
+    @staticmethod
+    def _host_failed(e: Exception) -> bool:
+        return not isinstance(e, ResponseError) or e.status >= 500
+
+    def __init__(self, base_urls: list, timeout: float = None, cache: ResponseCache = None,
+                 refresh_interval: float = 30.0, retry_after: float = 10.0) -> None:
+        if not base_urls:
+            raise ValueError("No base_urls provided.")
+        self.base_urls = list(base_urls)
+        self.refresh_interval = refresh_interval
+        self.retry_after = retry_after
+        self._backends = [_Backend(OllamaClient(url, timeout=timeout, cache=cache)) for url in self.base_urls]
+        self._lock = threading.Lock()
+        self._discovered_at = None
+
+    def discover(self) -> None:
+        """Ask every server which models it has installed and loaded."""
+        for backend in self._backends:
+            try:
+                models = {_model_name(m["name"]) for m in backend.client.list_models()["models"]}
+                loaded = {_model_name(m["name"]) for m in backend.client.list_running_models().get("models", [])}
+            except self._FAILURES as e:
+                if self._host_failed(e):
+                    backend.failed_until = time.monotonic() + self.retry_after
+                continue
+            with self._lock:
+                backend.models, backend.loaded = models, loaded
+                backend.failed_until = 0.0
+        self._discovered_at = time.monotonic()
+
+    def _candidates(self, model: str) -> list:
+        if self._discovered_at is None or time.monotonic() - self._discovered_at > self.refresh_interval:
+            self.discover()
+        name = _model_name(model)
+        now = time.monotonic()
+        with self._lock:
+            # with every server failing recently, try them all again rather than none
+            healthy = [b for b in self._backends if b.failed_until <= now] or list(self._backends)
+            serving = [b for b in healthy if name in b.models] or healthy
+            return sorted(serving, key=lambda b: (name not in b.loaded, b.outstanding))
+
+    def _call(self, model: str, func):
+        errors = []
+        for backend in self._candidates(model):
+            with self._lock:
+                backend.outstanding += 1
+            try:
+                result = func(backend.client)
+            except self._FAILURES as e:
+                if not self._host_failed(e):
+                    raise
+                backend.failed_until = time.monotonic() + self.retry_after
+                errors.append(f"{backend.client.base_url}: {e}")
+                continue
+            finally:
+                with self._lock:
+                    backend.outstanding -= 1
+            backend.loaded.add(_model_name(model))
+            return result
+        raise ConnectionError(f"No Ollama server could serve model {model}: {errors}")
+
+    def _call_stream(self, model: str, func):
+        errors = []
+        for backend in self._candidates(model):
+            with self._lock:
+                backend.outstanding += 1
+            started = False
+            try:
+                for partial_response in func(backend.client):
+                    started = True
+                    yield partial_response
+                backend.loaded.add(_model_name(model))
+                return
+            except self._FAILURES as e:
+                if not self._host_failed(e):
+                    raise
+                backend.failed_until = time.monotonic() + self.retry_after
+                if started:
+                    raise
+                errors.append(f"{backend.client.base_url}: {e}")
+            finally:
+                with self._lock:
+                    backend.outstanding -= 1
+        raise ConnectionError(f"No Ollama server could serve model {model}: {errors}")
+
+    def generate(self, model:str, prompt:str, system:str=None, context:list=None, keep_alive=None, options:dict=None,
+                 cancel:CancelToken=None) -> dict:
+        return self._call(model, lambda c: c.generate(model, prompt, system, context, keep_alive, options, cancel))
+
+    def generate_stream(self, model:str, prompt:str, system:str=None, context:list=None, keep_alive=None, options:dict=None,
+                        cancel:CancelToken=None):
+        yield from self._call_stream(model, lambda c: c.generate_stream(model, prompt, system, context, keep_alive,
+                                                                        options, cancel))
+
+    def chat(self, model:str, messages:list, keep_alive=None, options:dict=None, cancel:CancelToken=None) -> dict:
+        return self._call(model, lambda c: c.chat(model, messages, keep_alive, options, cancel))
+
+    def chat_stream(self, model:str, messages:list, keep_alive=None, options:dict=None, cancel:CancelToken=None):
+        yield from self._call_stream(model, lambda c: c.chat_stream(model, messages, keep_alive, options, cancel))
+
+    def embed(self, model:str, input, truncate:bool=None, keep_alive=None, options:dict=None, batch_size:int=64,
+              cancel:CancelToken=None) -> dict:
+        return self._call(model, lambda c: c.embed(model, input, truncate, keep_alive, options, batch_size, cancel))
+
+    def load_model(self, model:str, keep_alive=None, messages:list=None, options:dict=None) -> dict:
+        return self._call(model, lambda c: c.load_model(model, keep_alive, messages, options))
+
+    def list_models(self) -> dict:
+        """Models installed on any reachable server, in the /api/tags format."""
+        self.discover()
+        models, seen = [], set()
+        for backend in self._backends:
+            for name in sorted(backend.models - seen):
+                models.append({"name": name})
+                seen.add(name)
+        return {"models": models}
+
+    def list_running_models(self) -> dict:
+        self.discover()
+        return {"models": [{"name": name} for name in sorted(set().union(*(b.loaded for b in self._backends)))]}
 
 
 # class OllamaClientRequests:
@@ -180,132 +954,1053 @@ class OllamaClient:
 #         return json.loads(response.decode())
 
 
-class AsyncOllamaClient:
-    def __init__(self, base_url: str = "http://localhost:11434") -> None:
-        self.base_url = base_url
-        parsed_url = urlparse(base_url)
-        self._HTTPclient = http.client.HTTPConnection(parsed_url.netloc)
+class NDJSONDecoder:
+    """Incremental decoder for newline delimited JSON streams.
 
-    async def generate(self, model:str, prompt:str,system:str=None, stream:bool = False):
-        headers = {'Content-type': 'application/json'}
-        body = {
-            "model": model,
-            "prompt": prompt,
-            "stream": stream
-        }
-        if system:
-            body["system"] = system
+    Raw blocks are appended to one bytearray and complete lines are parsed straight from
+    bytes, so UTF-8 sequences split across reads are only decoded once the line is complete.
+    """
+    def __init__(self) -> None:
+        self._buffer = bytearray()
 
-        self._HTTPclient.request("POST", "/api/generate", json.dumps(body), headers)
-        response = self._HTTPclient.getresponse()
+    def feed(self, data: bytes) -> list:
+        buffer = self._buffer
+        start = len(buffer)
+        buffer += data
+        if buffer.find(b"\n", start) == -1:
+            return []
+        objects = []
+        pos = 0
+        with memoryview(buffer) as view:
+            while (end := buffer.find(b"\n", pos)) != -1:
+                if end > pos:
+                    line = view[pos:end].tobytes()
+                    if not line.isspace():
+                        objects.append(json.loads(line))
+                pos = end + 1
+        del buffer[:pos]
+        return objects
 
-        if not stream:
-            response_str = response.read().decode()
-            yield json.loads(response_str)
+    def flush(self) -> list:
+        # parse a trailing line that was not terminated by a newline
+        remaining = bytes(self._buffer).strip()
+        self._buffer.clear()
+        return [json.loads(remaining)] if remaining else []
 
-        else:
-        # If streaming, process each line as it arrives
-            buffer = ""
+
+def iter_ndjson(response, block_size: int = 65536):
+    """Yield JSON objects from a blocking file-like response (e.g. http.client.HTTPResponse)."""
+    decoder = NDJSONDecoder()
+    read = getattr(response, "read1", response.read)
+    while chunk := read(block_size):
+        yield from decoder.feed(chunk)
+    yield from decoder.flush()
+
+
+async def aiter_ndjson(chunks):
+    """Yield JSON objects from an async iterator of raw byte blocks."""
+    decoder = NDJSONDecoder()
+    async for chunk in chunks:
+        for obj in decoder.feed(chunk):
+            yield obj
+    for obj in decoder.flush():
+        yield obj
+
+
+class AsyncHTTPResponse:
+    """HTTP/1.1 response read from an asyncio stream (Content-Length, chunked or read-until-close bodies)."""
+    def __init__(self, reader: asyncio.StreamReader, status: int, reason: str, headers: dict) -> None:
+        self._reader = reader
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+        self.chunked = "chunked" in headers.get("transfer-encoding", "").lower()
+        self.length = int(headers["content-length"]) if "content-length" in headers and not self.chunked else None
+        self.will_close = headers.get("connection", "").lower() == "close" or (not self.chunked and self.length is None)
+        self.complete = False
+
+    async def iter_chunks(self, size: int = 65536):
+        # yield raw body blocks as soon as they arrive
+        if self.chunked:
             while True:
-                chunk = response.read(1).decode()
-                if not chunk:
+                line = await self._reader.readline()
+                if not line:
+                    raise ConnectionError("Connection closed while reading chunked response")
+                chunk_size = int(line.split(b";", 1)[0].strip(), 16)
+                if chunk_size == 0:
+                    # skip trailers up to the final empty line
+                    while (await self._reader.readline()) not in (b"\r\n", b"\n", b""):
+                        pass
                     break
-                buffer += chunk
-                if buffer.endswith('\n'):
-                    line = buffer.strip()
-                    buffer = ""
-                    yield json.loads(line)
+                yield await self._reader.readexactly(chunk_size)
+                await self._reader.readexactly(2)  # CRLF after each chunk
+        elif self.length is not None:
+            remaining = self.length
+            while remaining > 0:
+                chunk = await self._reader.read(min(size, remaining))
+                if not chunk:
+                    raise ConnectionError("Connection closed before full response was received")
+                remaining -= len(chunk)
+                yield chunk
+        else:
+            while chunk := await self._reader.read(size):
+                yield chunk
+        self.complete = True
 
-    async def chat(self, model: str, messages: list, stream: bool = False):
-        headers = {'Content-type': 'application/json'}
-        body = json.dumps({
-            "model": model,
-            "messages": messages,
-            "stream": stream
-        })
+    async def read(self) -> bytes:
+        body = bytearray()
+        async for chunk in self.iter_chunks():
+            body += chunk
+        return bytes(body)
 
-        self._HTTPclient.request("POST", "/api/chat", body, headers)
-        response = self._HTTPclient.getresponse()
-        if not response.status == 200:
-            raise AssertionError(f"Ollama Server returns http status code: {response.status_code}")
 
-        if not stream:
-            response_str = response.read().decode()
-            yield json.loads(response_str)
+class AsyncHTTPConnection:
+    """Minimal HTTP/1.1 client connection on top of asyncio.open_connection."""
+    def __init__(self, host: str, port: int = 80, timeout: float = None) -> None:
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self._reader = None
+        self._writer = None
+
+    @classmethod
+    def from_url(cls, base_url: str, timeout: float = None) -> "AsyncHTTPConnection":
+        parsed_url = urlparse(base_url)
+        return cls(parsed_url.hostname, parsed_url.port or 80, timeout)
+
+    async def connect(self) -> None:
+        self._reader, self._writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port), self.timeout)
+
+    async def request(self, method: str, path: str, body: bytes = None, headers: dict = None) -> AsyncHTTPResponse:
+        if self._writer is None:
+            await self.connect()
+        if isinstance(body, str):
+            body = body.encode()
+        lines = [f"{method} {path} HTTP/1.1", f"Host: {self.host}:{self.port}", "Connection: keep-alive"]
+        for key, value in (headers or {}).items():
+            lines.append(f"{key}: {value}")
+        if body is not None:
+            lines.append(f"Content-Length: {len(body)}")
+        self._writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + (body or b""))
+        await self._writer.drain()
+        return await asyncio.wait_for(self._read_head(), self.timeout)
+
+    async def _read_head(self) -> AsyncHTTPResponse:
+        status_line = await self._reader.readline()
+        if not status_line:
+            raise ConnectionError("Ollama Server closed the connection without response")
+        _, status, *reason = status_line.decode("latin-1").strip().split(" ", 2)
+        headers = {}
+        while (line := await self._reader.readline()) not in (b"\r\n", b"\n", b""):
+            key, _, value = line.decode("latin-1").partition(":")
+            headers[key.strip().lower()] = value.strip()
+        return AsyncHTTPResponse(self._reader, int(status), reason[0] if reason else "", headers)
+
+    def is_healthy(self) -> bool:
+        # an idle keep-alive stream has nothing to read; EOF or pending data means it went stale
+        return self._writer is not None and not self._writer.is_closing() and not self._reader.at_eof()
+
+    def abort(self) -> None:
+        # drop the transport right away; a pending read sees EOF
+        if self._writer is not None:
+            self._writer.transport.abort()
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = self._writer = None
+
+
+class AsyncConnectionPool:
+    """Bounded pool of keep-alive AsyncHTTPConnections, shared per base_url and event loop."""
+    _pools = weakref.WeakKeyDictionary()
+
+    def __init__(self, base_url: str, maxsize: int = 4, idle_timeout: float = 60.0, timeout: float = None) -> None:
+        self.base_url = base_url
+        self.maxsize = maxsize
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self._idle = []  # (connection, last_used) pairs, most recently used last
+        self._slots = asyncio.Semaphore(maxsize)
+        self._cancel_hooks = {}  # id(connection) -> unregister function of its CancelToken callback
+
+    @classmethod
+    def for_url(cls, base_url: str, **kwargs) -> "AsyncConnectionPool":
+        pools = cls._pools.setdefault(asyncio.get_running_loop(), {})
+        if (pool := pools.get(base_url)) is None:
+            pool = pools[base_url] = cls(base_url, **kwargs)
+        return pool
+
+    async def acquire(self) -> tuple:
+        """Borrow a connection, waiting while all maxsize connections are in use. Returns (connection, reused)."""
+        await self._slots.acquire()
+        now = time.monotonic()
+        while self._idle:
+            connection, last_used = self._idle.pop()
+            if now - last_used <= self.idle_timeout and connection.is_healthy():
+                return connection, True
+            connection.close()
+        return AsyncHTTPConnection.from_url(self.base_url, self.timeout), False
+
+    def release(self, connection: AsyncHTTPConnection, response: AsyncHTTPResponse = None) -> None:
+        """Return a connection; it is only kept alive if its last response was read completely."""
+        self._unwatch(connection)
+        if response is None or (response.complete and not response.will_close):
+            self._idle.append((connection, time.monotonic()))
         else:
-            buffer = ""
-            while True:
-                chunk = response.read(1).decode()
-                if not chunk:
-                    break
-                buffer += chunk
-                if buffer.endswith('\n'):
-                    line = buffer.strip()
-                    buffer = ""
-                    yield json.loads(line)
+            connection.close()
+        self._slots.release()
+
+    def _watch(self, connection: AsyncHTTPConnection, cancel: CancelToken) -> None:
+        if cancel is not None:
+            # cancel() may be called from any thread, the transport must be aborted on its loop
+            loop = asyncio.get_running_loop()
+            self._cancel_hooks[id(connection)] = cancel.register(lambda: loop.call_soon_threadsafe(connection.abort))
+
+    def _unwatch(self, connection: AsyncHTTPConnection) -> None:
+        if (unregister := self._cancel_hooks.pop(id(connection), None)) is not None:
+            unregister()
+
+    async def request(self, method: str, path: str, body: bytes = None, headers: dict = None,
+                      cancel: CancelToken = None, timeout: float = _POOL_TIMEOUT) -> tuple:
+        """Send a request on a pooled connection and return (connection, response).
+
+        A reused keep-alive stream that turns out to be stale is retried once on a fresh connection.
+        With a CancelToken the transport is aborted on cancel() until the connection is released.
+        The caller must hand the connection back with release() after consuming the response.
+        """
+        if timeout is _POOL_TIMEOUT:
+            timeout = self.timeout
+        connection, reused = await self.acquire()
+        while True:
+            try:
+                if cancel is not None and cancel.cancelled:
+                    raise RequestCancelled()
+                connection.timeout = timeout  # see ConnectionPool.request
+                if connection._writer is None:
+                    await connection.connect()
+                self._watch(connection, cancel)
+                response = await connection.request(method, path, body, headers)
+                if cancel is not None and cancel.cancelled:
+                    raise RequestCancelled()
+                return connection, response
+            except (ConnectionError, asyncio.IncompleteReadError):
+                self._unwatch(connection)
+                connection.close()
+                if cancel is not None and cancel.cancelled:
+                    self._slots.release()
+                    raise RequestCancelled() from None
+                if not reused:
+                    self._slots.release()
+                    raise
+                connection, reused = AsyncHTTPConnection.from_url(self.base_url, self.timeout), False
+            except BaseException as e:
+                self._unwatch(connection)
+                connection.close()
+                self._slots.release()
+                if cancel is not None and cancel.cancelled and not isinstance(e, RequestCancelled):
+                    raise RequestCancelled() from None
+                raise
+
+    def close(self) -> None:
+        for connection, _ in self._idle:
+            connection.close()
+        self._idle = []
+
+
+class AsyncOllamaClient:
+    def __init__(self, base_url: str = "http://localhost:11434", timeout: float = None,
+                 scheduler: RequestScheduler = None, priority: int = INTERACTIVE) -> None:
+        self.base_url = base_url
+        self.timeout = timeout
+        self.scheduler = scheduler  # see OllamaClient; waiting for a slot happens in a worker thread
+        self.priority = priority
+
+    async def _acquire(self, model: str, cancel: CancelToken = None) -> None:
+        acquired = asyncio.ensure_future(asyncio.to_thread(self.scheduler.acquire, model, self.priority, cancel))
+        try:
+            await asyncio.shield(acquired)
+        except asyncio.CancelledError:
+            # the worker thread keeps waiting, hand the slot back once it got one
+            acquired.add_done_callback(lambda f: f.exception() is None and self.scheduler.release(model))
+            raise
+
+    async def _request(self, method: str, path: str, body: dict = None, cancel: CancelToken = None):
+        # connections are borrowed per request so several requests can be in flight on one loop
+        pool = AsyncConnectionPool.for_url(self.base_url)
+        headers = {'Content-type': 'application/json'} if body is not None else None
+        connection, response = await pool.request(method, path, encode_body(body) if body is not None else None,
+                                                  headers, cancel, self.timeout)
+        if not response.status == 200:
+            pool.release(connection, response)
+            raise ResponseError(response.status)
+        return pool, connection, response
+
+    async def _stream(self, method: str, path: str, body: dict, stream: bool, cancel: CancelToken = None):
+        scheduled = self.scheduler is not None and "model" in body
+        if scheduled:
+            await self._acquire(body["model"], cancel)
+        try:
+            pool, connection, response = await self._request(method, path, body, cancel)
+            try:
+                if not stream:
+                    yield json.loads(await response.read())
+                else:
+                    # If streaming, process each line as it arrives
+                    async for partial_response in aiter_ndjson(response.iter_chunks()):
+                        yield partial_response
+            except (ConnectionError, ValueError, asyncio.IncompleteReadError):
+                if cancel is not None and cancel.cancelled:
+                    raise RequestCancelled() from None
+                raise
+            finally:
+                pool.release(connection, response)
+        finally:
+            if scheduled:
+                self.scheduler.release(body["model"])
+        if cancel is not None and cancel.cancelled:
+            raise RequestCancelled()
+
+    async def generate(self, model:str, prompt:str,system:str=None, stream:bool = False, context:list=None,
+                       keep_alive=None, options:dict=None, cancel:CancelToken=None):
+        body = OllamaClient._generate_body(model, prompt, system, stream, context, keep_alive, options)
+        async for partial_response in self._stream("POST", "/api/generate", body, stream, cancel):
+            yield partial_response
+
+    async def chat(self, model: str, messages: list, stream: bool = False, keep_alive=None, options:dict=None,
+                   cancel:CancelToken=None):
+        body = OllamaClient._chat_body(model, messages, stream, keep_alive, options)
+        async for partial_response in self._stream("POST", "/api/chat", body, stream, cancel):
+            yield partial_response
+
+    async def embed(self, model:str, input, truncate:bool=None, keep_alive=None, options:dict=None,
+                    batch_size:int=64, cancel:CancelToken=None) -> dict:
+        embeddings = []
+        for body in OllamaClient._embed_bodies(model, input, truncate, keep_alive, options, batch_size):
+            async for response in self._stream("POST", "/api/embed", body, False, cancel):
+                embeddings.extend(response["embeddings"])
+        return {"model": model, "embeddings": embeddings}
 
     async def list_models(self):
-        self._HTTPclient.request("GET", "/api/ps")
-        response = self._HTTPclient.getresponse()
-        response_str = response.read().decode()
-        return json.loads(response_str)
+        pool, connection, response = await self._request("GET", "/api/ps")
+        try:
+            return json.loads(await response.read())
+        finally:
+            pool.release(connection, response)
 
 
 #----------------------------------------------------------------------
 
 
-class Ollama:
-    def __init__(self, model:str="llama3", system:str=None, base_url:str ="http://localhost:11434") -> None:
-        self.base_url = base_url
-        self._client = OllamaClient(base_url)
-        self.model = model
-        available_models = self.list_models()
-        if not model in available_models:
+class ModelCatalog:
+    """Cached list of the models installed on the Ollama server.
+
+    models() answers from the cache while it is younger than ttl seconds. A stale cache is still
+    returned immediately while a background refresh runs; only an empty cache blocks on the
+    server. Callbacks registered with on_refresh run (on the refreshing thread) with the new list.
+    """
+    def __init__(self, client: OllamaClient, ttl: float = 60.0) -> None:
+        self._client = client
+        self.ttl = ttl
+        self._models = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+        self._refreshing = None
+        self._callbacks = []
+
+    def _fetch(self) -> list:
+        models = [_model_name(model["name"]) for model in self._client.list_models()["models"]]
+        with self._lock:
+            self._models = models
+            self._loaded_at = time.monotonic()
+            callbacks = list(self._callbacks)
+        for callback in callbacks:
+            callback(models)
+        return models
+
+    def cached(self) -> list:
+        """Models known without any network access (empty before the first refresh)."""
+        return list(self._models or [])
+
+    def is_stale(self) -> bool:
+        return self._models is None or time.monotonic() - self._loaded_at > self.ttl
+
+    def models(self, refresh: bool = False) -> list:
+        if refresh or self._models is None:
+            return self._fetch()
+        if self.is_stale():
+            self.refresh_in_background()
+        return self.cached()
+
+    def refresh_in_background(self) -> threading.Thread:
+        with self._lock:
+            if self._refreshing is not None and self._refreshing.is_alive():
+                return self._refreshing
+            self._refreshing = threading.Thread(target=self._refresh_quietly, daemon=True)
+            self._refreshing.start()
+            return self._refreshing
+
+    def _refresh_quietly(self) -> None:
+        try:
+            self._fetch()
+        except Exception:
+            pass  # keep the previous list, the next call retries
+
+    def on_refresh(self, callback) -> None:
+        self._callbacks.append(callback)
+
+    def validate(self, model: str) -> None:
+        """Raise ValueError if model is not installed; refreshes once before giving up."""
+        if _model_name(model) in self.models():
+            return
+        available_models = self.models(refresh=True)
+        if _model_name(model) not in available_models:
             raise ValueError(f"Model not installed in Ollama. Available models are {available_models}")
-        self.system = system
+
+
+def estimate_tokens(message: dict, chars_per_token: float = 4.0) -> int:
+    """Rough token estimate of a chat message (content length plus a small per-message overhead)."""
+    return int(len(message.get("content", "")) / chars_per_token) + 4
+
+
+class Conversation:
+    """Chat history with a token budget for what is sent to the model.
+
+    All messages are kept in self.messages as Message records (read-only mappings, to_dict() gives
+    a plain dict, e.g. for json.dumps). The window sent with a request consists of the pinned
+    system prompt, an optional summary of evicted turns and the most recent messages that fit into
+    max_tokens. Evicted messages stay evicted (only pop() undoes the evictions the popped message
+    caused), so the window only ever slides forward and the running token count is updated incrementally.
+    """
+    def __init__(self, system: str = None, max_tokens: int = None, summarizer=None) -> None:
+        self.max_tokens = max_tokens
+        self.summarizer = summarizer  # callable(summary:str|None, evicted:list) -> str
+        self.summary = None
         self.messages = []
+        self._tokens = []
+        self._pinned = 0
+        self._start = 0  # index of the first message inside the sliding window
+        self._window_tokens = 0
+        self._states = []  # per message the window (start, tokens, summary) before it was added, for pop()
+        self.last_request_tokens = 0
+        self._listeners = []
         if system:
-            self.messages.append({"role": "system", "content":system})
-        self._asyncclient = AsyncOllamaClient(base_url)
+            self._add({"role": "system", "content": system})
+            self._pinned = self._start = 1
+
+    def add_listener(self, on_append, on_pop=None) -> None:
+        """Get notified about appended messages (e.g. to persist them) and removed prompts."""
+        self._listeners.append((on_append, on_pop))
+
+    def _add(self, message: dict) -> Message:
+        message = Message.of(message)  # validated and serialized once
+        tokens = estimate_tokens(message)
+        self._states.append((self._start, self._window_tokens, self.summary))
+        self.messages.append(message)
+        self._tokens.append(tokens)
+        self._window_tokens += tokens
+        return message
+
+    def append(self, message: dict) -> None:
+        message = self._add(message)
+        for on_append, _ in self._listeners:
+            on_append(message)
+
+    def load(self, messages: list) -> None:
+        """Replace the history after the system prompt, e.g. with a stored session (listeners are not notified)."""
+        self.clear()
+        for message in messages:
+            self._add({"role": message["role"], "content": message["content"]})
+
+    def pop(self) -> dict:
+        """Remove and return the newest message (e.g. a prompt whose request was cancelled).
+
+        The window goes back to what it was before the message was added, so turns it evicted are
+        sent again.
+        """
+        if len(self.messages) <= self._pinned:
+            raise IndexError("pop from empty conversation")
+        message = self.messages.pop()
+        self._tokens.pop()
+        self._start, self._window_tokens, self.summary = self._states.pop()
+        for _, on_pop in self._listeners:
+            if on_pop is not None:
+                on_pop(message)
+        return message
+
+    def clear(self) -> None:
+        del self.messages[self._pinned:]
+        del self._tokens[self._pinned:]
+        del self._states[self._pinned:]
+        self._start = self._pinned
+        self._window_tokens = sum(self._tokens)
+        self.summary = None
+
+    def window(self) -> list:
+        """Return the messages to send with the next request and record their token count."""
+        if self.max_tokens is not None:
+            self._slide()
+        window = self.messages[:self._pinned]
+        if self.summary:
+            window.append(self._summary_message())
+        window.extend(self.messages[self._start:])
+        self.last_request_tokens = self._window_tokens + (estimate_tokens(window[self._pinned]) if self.summary else 0)
+        return window
 
-    def generate(self, prompt:str) -> str:
-        response = self._OllamaClient.generate(model=self.model, prompt=prompt, system=self.system)
+    def _summary_message(self) -> dict:
+        return {"role": "system", "content": f"Summary of the earlier conversation: {self.summary}"}
+
+    def _slide(self) -> None:
+        budget = self.max_tokens
+        if self.summary:
+            budget -= estimate_tokens(self._summary_message())
+        start = self._start
+        last = len(self.messages) - 1  # never evict the newest message
+        while self._window_tokens > budget and start < last:
+            self._window_tokens -= self._tokens[start]
+            start += 1
+        # do not start the window with an orphaned assistant answer
+        while start < last and self.messages[start]["role"] == "assistant":
+            self._window_tokens -= self._tokens[start]
+            start += 1
+        if start == self._start:
+            return
+        evicted = self.messages[self._start:start]
+        self._start = start
+        if self.summarizer:
+            self.summary = self.summarizer(self.summary, evicted)
+
+
+class Metrics:
+    """Rolling per-request timing stats of an Ollama instance.
+
+    Every completed request is recorded with client-side timings (time to first token, total
+    time) and the server's timings from the done frame (Ollama reports them in nanoseconds,
+    they are stored in seconds). Only the last `window` requests are kept; histograms and
+    summaries are computed over them and can be exported as CSV or Prometheus text format.
+    """
+    FIELDS = ("time", "model", "ttft", "total", "server_total", "load", "prompt_eval", "prompt_tokens",
+              "tokens", "tokens_per_second", "client_tokens_per_second")
+    # histogram buckets (upper bounds) per field, exported as ollama_<field>
+    BUCKETS = {
+        "ttft": (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+        "total": (0.5, 1, 2.5, 5, 10, 30, 60, 120),
+        "load": (0.01, 0.1, 0.5, 1, 2.5, 5, 10, 30),
+        "prompt_eval": (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+        "tokens_per_second": (1, 5, 10, 20, 40, 80, 160, 320),
+    }
+    HELP = {
+        "ttft": ("ttft_seconds", "Client-side time to the first token"),
+        "total": ("request_seconds", "Client-side request duration"),
+        "load": ("load_seconds", "Server-side model load time"),
+        "prompt_eval": ("prompt_eval_seconds", "Server-side prompt evaluation time"),
+        "tokens_per_second": ("tokens_per_second", "Server-side generation speed"),
+    }
+
+    def __init__(self, window: int = 1000) -> None:
+        self._records = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self._callbacks = []
+
+    def record(self, model: str, started: float, first_token: float, stats: dict) -> dict:
+        """Record a finished request; started/first_token are time.perf_counter() values."""
+        finished = time.perf_counter()
+        first_token = finished if first_token is None else first_token
+        eval_count = stats.get("eval_count", 0)
+        eval_seconds = stats.get("eval_duration", 0) / 1e9
+        record = {
+            "time": time.time(),
+            "model": model,
+            "ttft": first_token - started,
+            "total": finished - started,
+            "server_total": stats.get("total_duration", 0) / 1e9,
+            "load": stats.get("load_duration", 0) / 1e9,
+            "prompt_eval": stats.get("prompt_eval_duration", 0) / 1e9,
+            "prompt_tokens": stats.get("prompt_eval_count", 0),
+            "tokens": eval_count,
+            "tokens_per_second": eval_count / eval_seconds if eval_seconds else 0.0,
+            "client_tokens_per_second": eval_count / (finished - first_token) if finished > first_token else 0.0,
+        }
+        with self._lock:
+            self._records.append(record)
+        for callback in self._callbacks:
+            callback(record)
+        return record
+
+    def on_record(self, callback) -> None:
+        self._callbacks.append(callback)
+
+    def records(self, model: str = None) -> list:
+        with self._lock:
+            records = list(self._records)
+        return [r for r in records if r["model"] == model] if model else records
+
+    def summary(self, field: str, model: str = None) -> dict:
+        values = [r[field] for r in self.records(model)]
+        return {
+            "count": len(values),
+            "mean": sum(values) / len(values) if values else 0.0,
+            "p50": percentile(values, 50),
+            "p95": percentile(values, 95),
+            "last": values[-1] if values else 0.0,
+        }
+
+    def histogram(self, field: str, buckets: tuple = None, model: str = None) -> list:
+        """Cumulative [(upper bound, count), ...] like a Prometheus histogram, ending with +inf."""
+        values = [r[field] for r in self.records(model)]
+        bounds = list(buckets or self.BUCKETS[field]) + [float("inf")]
+        return [(bound, sum(1 for value in values if value <= bound)) for bound in bounds]
+
+    def write_csv(self, file) -> None:
+        """Write all recorded requests to a file object opened with newline=""."""
+        writer = csv.DictWriter(file, fieldnames=self.FIELDS)
+        writer.writeheader()
+        writer.writerows(self.records())
+
+    def prometheus(self) -> str:
+        """Histograms of the recorded requests per model in Prometheus text exposition format."""
+        records = self.records()
+        models = sorted({r["model"] for r in records})
+        lines = []
+        for field, (name, help_text) in self.HELP.items():
+            lines.append(f"# HELP ollama_{name} {help_text}")
+            lines.append(f"# TYPE ollama_{name} histogram")
+            for model in models:
+                values = [r[field] for r in records if r["model"] == model]
+                label = 'model="' + model.replace("\\", "\\\\").replace('"', '\\"') + '"'
+                for bound, count in self.histogram(field, model=model):
+                    le = "+Inf" if bound == float("inf") else repr(float(bound))
+                    lines.append(f'ollama_{name}_bucket{{{label},le="{le}"}} {count}')
+                lines.append(f"ollama_{name}_sum{{{label}}} {sum(values)!r}")
+                lines.append(f"ollama_{name}_count{{{label}}} {len(values)}")
+        return "\n".join(lines) + "\n"
+
+
+def plan_model_batches(models: list, sizes: dict, budget: float) -> list:
+    """Split models into batches that fit into budget bytes of VRAM together (first fit, in order).
+
+    sizes maps model names to their memory size; models of unknown size or larger than the budget
+    get a batch of their own.
+    """
+    batches = []  # [models, bytes used]
+    for model in models:
+        size = sizes.get(_model_name(model))
+        batch = next((b for b in batches if size is not None and b[1] + size <= budget), None)
+        if batch is None:
+            batches.append([[model], size if size is not None else float("inf")])
+        else:
+            batch[0].append(model)
+            batch[1] += size
+    return [batch[0] for batch in batches]
+
+
+class Ollama:
+    def __init__(self, model:str="llama3", system:str=None, base_url:str ="http://localhost:11434",
+                 max_context_tokens:int=None, summarize:bool=False, keep_alive=None, options:dict=None,
+                 cache:ResponseCache=None, catalog:ModelCatalog=None, scheduler:RequestScheduler=None,
+                 priority:int=INTERACTIVE) -> None:
+        self.base_url = base_url
+        if isinstance(base_url, (list, tuple)):
+            # several servers: sync requests are balanced by an OllamaRouter, async ones use the first server
+            # (a scheduler only queues the async ones, the router already spreads the load)
+            self._client = OllamaRouter(base_url, cache=cache)
+            base_url = base_url[0]
+        else:
+            self._client = OllamaClient(base_url, cache=cache, scheduler=scheduler, priority=priority)
+        self.model = model  # validated lazily against self.catalog on the first request
+        self.catalog = catalog or ModelCatalog(self._client)  # may be shared by several instances
+        self._validated_model = None
+        self.system = system
+        self.conversation = Conversation(system, max_tokens=max_context_tokens,
+                                         summarizer=self._summarize if summarize else None)
+        self._asyncclient = AsyncOllamaClient(base_url, scheduler=scheduler, priority=priority)
+        self.last_stats = {}  # stats of the done frame of the last request
+        self.metrics = Metrics()  # timings of the recent requests
+        self.compare_metrics = Metrics()  # timings of compare() runs, kept out of self.metrics
+        self.keep_alive = keep_alive  # how long the server keeps the model loaded, see OllamaClient
+        self.options = options  # model parameters, e.g. {"num_ctx": 8192, "num_thread": 8}
+        self.context = None  # token context of the generate session, lets the server reuse its KV cache
+
+    @property
+    def messages(self) -> list:
+        """Complete chat history as plain dicts; only Conversation.window() of it is sent with a request.
+
+        Read-only: every access returns a new copy. Change the history through self.conversation
+        (append, pop, load) or start over with reset().
+        """
+        return [message.to_dict() for message in self.conversation.messages]
+
+    @property
+    def last_request_tokens(self) -> int:
+        """Estimated number of tokens carried by the messages of the last chat request."""
+        return self.conversation.last_request_tokens
+
+    def _check_model(self) -> None:
+        if self._validated_model != self.model:
+            self.catalog.validate(self.model)
+            self._validated_model = self.model
+
+    def _summarize(self, summary:str, evicted:list) -> str:
+        # condense turns that dropped out of the context window (blocking request to the model)
+        transcript = "\n".join(f"{m['role']}: {m['content']}" for m in evicted)
+        if summary:
+            transcript = f"Previous summary: {summary}\n{transcript}"
+        prompt = f"Summarize the following conversation in a few sentences, keep names and facts:\n{transcript}"
+        return self._client.generate(model=self.model, prompt=prompt, keep_alive=self.keep_alive)["response"].strip()
+
+    def load_model(self, keep_alive=None) -> None:
+        """Load the model into memory ahead of the first request (keep_alive defaults to self.keep_alive)."""
+        self._check_model()
+        self._client.load_model(self.model, keep_alive=self.keep_alive if keep_alive is None else keep_alive)
+
+    def preload(self) -> None:
+        """Load the model and let it evaluate the system prompt and the history, e.g. when a session opens.
+
+        The next chat request starts with the same messages, so the server only has to process the
+        new prompt before the first token. Without any messages this is load_model().
+        """
+        self._check_model()
+        self._client.load_model(self.model, keep_alive=self.keep_alive, messages=self.conversation.window(),
+                                options=self.options)
+
+    def reset_context(self) -> None:
+        """Start a new generate session."""
+        self.context = None
+
+    def reset(self) -> None:
+        """Start a new chat: clear the history (the system prompt stays) and the generate session."""
+        self.conversation.clear()
+        self.context = None
+
+    def _window(self, retrieved:str=None) -> list:
+        # the conversation's window; retrieved context goes in front of the new prompt but is not kept
+        messages = self.conversation.window()
+        if retrieved:
+            messages.insert(len(messages) - 1, {"role":"system", "content":retrieved})
+        return messages
+
+    def _record(self, started:float, first_token:float, response:dict) -> None:
+        # keep the stats of the done frame and add the request to self.metrics
+        self.last_stats = {k: v for k, v in response.items() if k not in ("response", "message", "context")}
+        self.metrics.record(self.model, started, first_token, self.last_stats)
+
+    # cancel: optional CancelToken; cancelling closes the connection so the server stops generating.
+    # Streams then simply end, chat()/generate() raise RequestCancelled.
+    # retrieved: context for this prompt only (e.g. KnowledgeBase.context()), sent as a system message
+    # before it; the conversation keeps just the prompt.
+
+    def generate(self, prompt:str, cancel:CancelToken=None) -> str:
+        self._check_model()
+        started = time.perf_counter()
+        response = self._client.generate(model=self.model, prompt=prompt, system=self.system, context=self.context,
+                                         keep_alive=self.keep_alive, options=self.options, cancel=cancel)
+        self._record(started, None, response)
+        self.context = response.get("context")
         return response["response"]
+
+    def generate_stream(self, prompt:str, cancel:CancelToken=None):
+        """Yield the response tokens as they arrive; the final stats end up in self.last_stats and self.metrics."""
+        self._check_model()
+        started, first_token = time.perf_counter(), None
+        try:
+            for partial_response in self._client.generate_stream(model=self.model, prompt=prompt, system=self.system,
+                                                                 context=self.context, keep_alive=self.keep_alive,
+                                                                 options=self.options, cancel=cancel):
+                if first_token is None:
+                    first_token = time.perf_counter()
+                if partial_response["done"]:
+                    self.context = partial_response.get("context")
+                    self._record(started, first_token, partial_response)
+                yield partial_response["response"]
+        except RequestCancelled:
+            pass
     
-    def chat(self, prompt:str) -> str:
-        self.messages.append({"role":"user", "content":prompt})
-        response = self._client.chat(model=self.model, messages=self.messages)
+    def chat(self, prompt:str, cancel:CancelToken=None, retrieved:str=None) -> str:
+        self._check_model()
+        self.conversation.append({"role":"user", "content":prompt})
+        started = time.perf_counter()
+        try:
+            response = self._client.chat(model=self.model, messages=self._window(retrieved),
+                                         keep_alive=self.keep_alive, options=self.options, cancel=cancel)
+        except RequestCancelled:
+            self.conversation.pop()
+            raise
+        self._record(started, None, response)
         msg = response["message"]
-        self.messages.append(msg)
+        self.conversation.append(msg)
         return msg["content"]
+
+    def chat_stream(self, prompt:str, cancel:CancelToken=None, retrieved:str=None):
+        """Yield the answer tokens as they arrive; the final stats end up in self.last_stats and self.metrics.
+
+        The (possibly partial) answer is appended to self.messages when the stream ends, is closed or
+        cancelled. Without any answer the prompt is removed again.
+        """
+        self._check_model()
+        self.conversation.append({"role":"user", "content":prompt})
+        msg_str = ""
+        started, first_token = time.perf_counter(), None
+        try:
+            for partial_response in self._client.chat_stream(model=self.model, messages=self._window(retrieved),
+                                                             keep_alive=self.keep_alive, options=self.options,
+                                                             cancel=cancel):
+                if first_token is None:
+                    first_token = time.perf_counter()
+                if partial_response["done"]:
+                    self._record(started, first_token, partial_response)
+                token = partial_response["message"]["content"]
+                msg_str += token
+                yield token
+        except RequestCancelled:
+            pass
+        finally:
+            if msg_str:
+                self.conversation.append({"role":"assistant", "content":msg_str})
+            else:
+                self.conversation.pop()
     
-    def list_models(self) -> list:
-        models_dict = self._client.list_models()["models"]
-        model_names = []
-        for model in models_dict:
-            model_names.append(model["name"].split(":latest")[0])
-        return model_names
+    def list_models(self, refresh:bool=False) -> list:
+        return self.catalog.models(refresh)
+
+    def embed(self, input, model:str=None) -> list:
+        """Embedding vectors of a text or a list of texts, by default with this instance's model."""
+        return self._client.embed(model or self.model, input)["embeddings"]
+
+    def compare(self, prompt:str, models:list, on_token=None, vram_budget:float=None, cancel:CancelToken=None) -> dict:
+        """Send one prompt to several models and return {model: record} with each answer and its timings.
+
+        Records are Metrics records (also kept in self.compare_metrics, not in self.metrics) plus
+        "response" (and "error" if the request failed). Models that fit into vram_budget bytes together
+        run concurrently, the others batch after batch so the server does not keep swapping them in and out. Without a budget, the VRAM used by the currently loaded
+        models (/api/ps) is what is assumed to fit. on_token(model, token) is called from worker threads.
+        The conversation is not changed. Models that were not loaded before are unloaded again after
+        their batch, the others keep the server's default keep_alive (this instance's model its own).
+        """
+        for model in models:
+            self.catalog.validate(model)
+        running = {_model_name(m["name"]): m for m in self._client.list_running_models().get("models", [])}
+        sizes = {_model_name(m["name"]): m["size"] for m in self._client.list_models().get("models", []) if "size" in m}
+        sizes.update({name: m["size"] for name, m in running.items() if "size" in m})
+        if vram_budget is None:
+            vram_budget = sum(m.get("size_vram", 0) for m in running.values())
+        messages = [{"role":"user", "content":prompt}]
+        if self.system:
+            messages.insert(0, {"role":"system", "content":self.system})
+
+        results = {}
+        batches = plan_model_batches(models, sizes, vram_budget)
+        for i, batch in enumerate(batches):
+            with concurrent.futures.ThreadPoolExecutor(len(batch)) as executor:
+                for model, result in zip(batch, executor.map(lambda m: self._compare_one(m, messages, on_token, cancel), batch)):
+                    results[model] = result
+            # make room for the next batch and leave nothing loaded that was not before
+            for model in batch:
+                if _model_name(model) not in running:
+                    try:
+                        self._client.load_model(model, keep_alive=0)
+                    except Exception:
+                        pass
+            if cancel is not None and cancel.cancelled:
+                break
+        for model in models:
+            results.setdefault(model, {"model": model, "error": "cancelled", "response": ""})
+        return results
+
+    def _compare_one(self, model:str, messages:list, on_token, cancel:CancelToken) -> dict:
+        started, first_token, tokens, result = time.perf_counter(), None, [], None
+        try:
+            # only this instance's model keeps its keep_alive, e.g. -1 would pin the others in memory
+            keep_alive = self.keep_alive if _model_name(model) == _model_name(self.model) else None
+            for partial_response in self._client.chat_stream(model=model, messages=messages, keep_alive=keep_alive,
+                                                             options=self.options, cancel=cancel):
+                if first_token is None:
+                    first_token = time.perf_counter()
+                token = partial_response["message"]["content"]
+                tokens.append(token)
+                if on_token is not None and token:
+                    on_token(model, token)
+                if partial_response["done"]:
+                    stats = {k: v for k, v in partial_response.items() if k != "message"}
+                    result = dict(self.compare_metrics.record(model, started, first_token, stats))
+            if result is None:
+                result = {"model": model, "error": "answer incomplete"}
+        except RequestCancelled:
+            result = {"model": model, "error": "cancelled"}
+        except Exception as e:
+            result = {"model": model, "error": str(e)}
+        result["response"] = "".join(tokens)
+        return result
     
-    async def agenerate(self, prompt:str, stream:bool=True):
-        msg_str = ""
-        async for partial_response in self._asyncclient.generate(
-            model=self.model, 
-            prompt=prompt, 
-            system=self.system, 
-            stream=stream
-            ):
-            if not partial_response["done"]:
-                msg_str = msg_str + partial_response["content"]
-            yield partial_response["content"]
-
-    async def achat(self, prompt:str, stream:str=True):
-        self.messages.append({"role":"user", "content":prompt})
+    async def agenerate(self, prompt:str, stream:bool=True, cancel:CancelToken=None):
+        await asyncio.to_thread(self._check_model)
+        started, first_token = time.perf_counter(), None
+        try:
+            async for partial_response in self._asyncclient.generate(
+                model=self.model, 
+                prompt=prompt, 
+                system=self.system, 
+                stream=stream,
+                context=self.context,
+                keep_alive=self.keep_alive,
+                options=self.options,
+                cancel=cancel
+                ):
+                if first_token is None:
+                    first_token = time.perf_counter()
+                if partial_response["done"]:
+                    self.context = partial_response.get("context")
+                    self._record(started, first_token, partial_response)
+                yield partial_response["response"]
+        except RequestCancelled:
+            pass
+
+    async def achat(self, prompt:str, stream:str=True, cancel:CancelToken=None, retrieved:str=None):
+        await asyncio.to_thread(self._check_model)
+        self.conversation.append({"role":"user", "content":prompt})
         msg_str = ""
-        async for partial_response in self._asyncclient.chat(self.model, self.messages, stream=stream):
-            if not partial_response["done"]:
+        started, first_token = time.perf_counter(), None
+        try:
+            # sliding the window may summarize evicted turns with a blocking request, so not on the loop
+            messages = await asyncio.to_thread(self._window, retrieved)
+            async for partial_response in self._asyncclient.chat(self.model, messages, stream=stream,
+                                                                 keep_alive=self.keep_alive, options=self.options,
+                                                                 cancel=cancel):
+                if first_token is None:
+                    first_token = time.perf_counter()
+                if partial_response["done"]:
+                    self._record(started, first_token, partial_response)
                 msg_str = msg_str + partial_response["message"]["content"]
-            yield partial_response["message"]["content"]
-        self.messages.append({"role":"assistant", "content":msg_str})
+                yield partial_response["message"]["content"]
+        except RequestCancelled:
+            pass
+        finally:
+            if msg_str:
+                self.conversation.append({"role":"assistant", "content":msg_str})
+            else:
+                self.conversation.pop()
+
+
+#----------------------------------------------------------------------
+
+
+def percentile(values: list, q: float) -> float:
+    """Nearest-rank percentile of values (q in [0, 100])."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(q / 100 * len(ordered) + 0.5) - 1))]
+
+
+class BatchRunner:
+    """Runs many generate/chat jobs with bounded concurrency over one pooled OllamaClient.
+
+    A job is a dict with either "prompt" (generate) or "messages" (chat) and optionally "id",
+    "model", "system", "options" and "keep_alive". Results are handed to on_result in completion
+    order as {"id", "model", "response", "latency", "eval_count", "error"} dicts. Jobs are sent
+    with BACKGROUND priority, so with a client that has a RequestScheduler, interactive requests
+    of the same process go first.
+    """
+    def __init__(self, client: OllamaClient, model: str = None, concurrency: int = 4,
+                 priority: int = BACKGROUND) -> None:
+        self.client = client.with_priority(priority)
+        self.model = model
+        self.concurrency = concurrency
+        client._pool.ensure_size(concurrency)
+
+    def _run_job(self, index: int, job: dict) -> dict:
+        model = job.get("model", self.model)
+        result = {"id": job.get("id", index), "model": model}
+        start = time.perf_counter()
+        try:
+            if "messages" in job:
+                response = self.client.chat(model, job["messages"], keep_alive=job.get("keep_alive"),
+                                            options=job.get("options"))
+                result["response"] = response["message"]["content"]
+            else:
+                response = self.client.generate(model, job["prompt"], system=job.get("system"),
+                                                keep_alive=job.get("keep_alive"), options=job.get("options"))
+                result["response"] = response["response"]
+            result["eval_count"] = response.get("eval_count", 0)
+        except Exception as e:
+            result["error"] = str(e)
+        result["latency"] = time.perf_counter() - start
+        return result
+
+    def run(self, jobs, on_result) -> dict:
+        """Run all jobs (any iterable, consumed lazily) and return throughput and latency stats."""
+        latencies, tokens, errors = [], 0, 0
+        start = time.perf_counter()
+        jobs = enumerate(jobs)
+        with concurrent.futures.ThreadPoolExecutor(self.concurrency) as executor:
+            pending = set()
+            exhausted = False
+            while pending or not exhausted:
+                # keep the executor busy without reading the whole input up front
+                while not exhausted and len(pending) < 2 * self.concurrency:
+                    try:
+                        index, job = next(jobs)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    pending.add(executor.submit(self._run_job, index, job))
+                if not pending:
+                    break
+                done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    result = future.result()
+                    if "error" in result:
+                        errors += 1
+                    else:
+                        latencies.append(result["latency"])
+                        tokens += result["eval_count"]
+                    on_result(result)
+        elapsed = time.perf_counter() - start
+        return {
+            "requests": len(latencies) + errors,
+            "errors": errors,
+            "elapsed": elapsed,
+            "throughput": (len(latencies) + errors) / elapsed if elapsed else 0.0,
+            "latency_p50": percentile(latencies, 50),
+            "latency_p95": percentile(latencies, 95),
+            "tokens_per_second": tokens / elapsed if elapsed else 0.0,
+        }
+
+
+def run_batch_file(input_path: str, output_path: str, model: str = None, base_url: str = "http://localhost:11434",
+                   concurrency: int = 4) -> dict:
+    """Run the jobs of a JSONL file and write one JSON result per line to output_path as they complete."""
+    runner = BatchRunner(OllamaClient(base_url), model=model, concurrency=concurrency)
+    with open(input_path, encoding="utf-8") as infile, open(output_path, "w", encoding="utf-8") as outfile:
+        jobs = (json.loads(line) for line in infile if line.strip())
+
+        def write(result):
+            outfile.write(json.dumps(result, ensure_ascii=False) + "\n")
+            outfile.flush()
+
+        return runner.run(jobs, write)
+
+
+def main(argv:list=None) -> int:
+    parser = argparse.ArgumentParser(prog="Ollama.py", description="Command line tools for the Ollama API.")
+    parser.add_argument("--base-url", default="http://localhost:11434")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    batch = commands.add_parser("batch", help="run the prompts of a JSONL file with bounded concurrency")
+    batch.add_argument("input", help='JSONL file, one job per line: {"prompt": ...} or {"messages": [...]}')
+    batch.add_argument("-o", "--output", required=True, help="JSONL file for the results (completion order)")
+    batch.add_argument("-m", "--model", default="llama3", help="default model for jobs without a model")
+    batch.add_argument("-c", "--concurrency", type=int, default=4)
+
+    args = parser.parse_args(argv)
+    if args.command == "batch":
+        stats = run_batch_file(args.input, args.output, model=args.model, base_url=args.base_url,
+                               concurrency=args.concurrency)
+        print(f"{stats['requests']} requests ({stats['errors']} failed) in {stats['elapsed']:.2f} s: "
+              f"{stats['throughput']:.2f} req/s, p50 {stats['latency_p50']:.3f} s, "
+              f"p95 {stats['latency_p95']:.3f} s, {stats['tokens_per_second']:.1f} tokens/s")
+        return 1 if stats["errors"] else 0
+    return 0
 
 
 #----------------------------------------------------------------------
@@ -330,6 +2025,10 @@ async def async_test_model():
     print(LLM.messages)
 
 if __name__ == "__main__":
+    # command line tools, e.g. python Ollama.py batch prompts.jsonl -o results.jsonl
+    if len(sys.argv) > 1:
+        sys.exit(main())
+
     # synchron client test
     client = OllamaClient()
     response = client.generate("llama3", "Who are you?")
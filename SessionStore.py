@@ -0,0 +1,114 @@
+import sqlite3
+import threading
+import time
+
+
+class SessionStore:
+    """Persistent chat sessions in a SQLite database (WAL journal).
+
+    Every message is appended as one row when it completes, so nothing is rewritten per message.
+    Sessions and messages are read page by page, and a full-text index (FTS5, if the sqlite3
+    build has it) makes the whole history searchable.
+    """
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS sessions (id INTEGER PRIMARY KEY, title TEXT, model TEXT, "
+                         "system TEXT, created REAL, updated REAL)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS messages (id INTEGER PRIMARY KEY, session_id INTEGER, "
+                         "role TEXT, content TEXT, created REAL)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS messages_session ON messages (session_id, id)")
+        self.fulltext = self._create_fulltext_index()
+
+    def _create_fulltext_index(self) -> bool:
+        try:
+            self._db.execute("CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5("
+                             "content, content='messages', content_rowid='id')")
+        except sqlite3.OperationalError:
+            return False  # no FTS5 in this sqlite build, search() falls back to LIKE
+        self._db.execute("CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN "
+                         "INSERT INTO messages_fts (rowid, content) VALUES (new.id, new.content); END")
+        self._db.execute("CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN "
+                         "INSERT INTO messages_fts (messages_fts, rowid, content) VALUES ('delete', old.id, old.content); END")
+        return True
+
+    def new_session(self, model: str, system: str = None, title: str = None) -> int:
+        now = time.time()
+        with self._lock:
+            cursor = self._db.execute("INSERT INTO sessions (title, model, system, created, updated) VALUES (?, ?, ?, ?, ?)",
+                                      (title, model, system, now, now))
+        return cursor.lastrowid
+
+    def append(self, session_id: int, message: dict) -> int:
+        """Append one message to a session and return its id."""
+        now = time.time()
+        with self._lock:
+            cursor = self._db.execute("INSERT INTO messages (session_id, role, content, created) VALUES (?, ?, ?, ?)",
+                                      (session_id, message["role"], message["content"], now))
+            # the first user message names the session
+            self._db.execute("UPDATE sessions SET updated = ?, title = COALESCE(title, CASE WHEN ? = 'user' "
+                             "THEN substr(?, 1, 80) END) WHERE id = ?",
+                             (now, message["role"], message["content"], session_id))
+        return cursor.lastrowid
+
+    def remove_last(self, session_id: int) -> None:
+        """Drop the newest message of a session (a prompt whose request was cancelled)."""
+        with self._lock:
+            self._db.execute("DELETE FROM messages WHERE id = (SELECT MAX(id) FROM messages WHERE session_id = ?)",
+                             (session_id,))
+
+    def sessions(self, limit: int = 50, offset: int = 0) -> list:
+        """Sessions ordered by last activity, newest first."""
+        with self._lock:
+            rows = self._db.execute("SELECT id, title, model, system, created, updated FROM sessions "
+                                    "ORDER BY updated DESC LIMIT ? OFFSET ?", (limit, offset)).fetchall()
+        return [dict(zip(("id", "title", "model", "system", "created", "updated"), row)) for row in rows]
+
+    def session(self, session_id: int) -> dict:
+        with self._lock:
+            row = self._db.execute("SELECT id, title, model, system, created, updated FROM sessions WHERE id = ?",
+                                   (session_id,)).fetchone()
+        return dict(zip(("id", "title", "model", "system", "created", "updated"), row)) if row else None
+
+    def messages(self, session_id: int, before_id: int = None, limit: int = 50) -> list:
+        """One page of a session's messages in chronological order, ending before message before_id."""
+        with self._lock:
+            rows = self._db.execute("SELECT id, role, content, created FROM messages WHERE session_id = ? AND id < ? "
+                                    "ORDER BY id DESC LIMIT ?",
+                                    (session_id, before_id if before_id is not None else 2**63 - 1, limit)).fetchall()
+        return [{"id": id, "role": role, "content": content, "created": created}
+                for id, role, content, created in reversed(rows)]
+
+    def all_messages(self, after_id: int = 0, limit: int = 500) -> list:
+        """One page of the messages of all sessions with an id above after_id, oldest first."""
+        with self._lock:
+            rows = self._db.execute("SELECT id, session_id, role, content, created FROM messages WHERE id > ? "
+                                    "ORDER BY id LIMIT ?", (after_id, limit)).fetchall()
+        return [{"id": id, "session_id": session_id, "role": role, "content": content, "created": created}
+                for id, session_id, role, content, created in rows]
+
+    def search(self, query: str, limit: int = 20) -> list:
+        """Full-text search over all messages, best matches first."""
+        with self._lock:
+            if self.fulltext:
+                # quote every term so user input cannot break the FTS query syntax
+                terms = " ".join('"' + term.replace('"', '""') + '"' for term in query.split())
+                if not terms:
+                    return []
+                rows = self._db.execute(
+                    "SELECT m.id, m.session_id, m.role, snippet(messages_fts, 0, '[', ']', '...', 12) "
+                    "FROM messages_fts JOIN messages m ON m.id = messages_fts.rowid "
+                    "WHERE messages_fts MATCH ? ORDER BY rank LIMIT ?", (terms, limit)).fetchall()
+            else:
+                rows = self._db.execute("SELECT id, session_id, role, substr(content, 1, 120) FROM messages "
+                                        "WHERE content LIKE ? ORDER BY id DESC LIMIT ?",
+                                        (f"%{query}%", limit)).fetchall()
+        return [{"id": id, "session_id": session_id, "role": role, "snippet": snippet}
+                for id, session_id, role, snippet in rows]
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,218 @@
+import array
+import heapq
+import json
+import math
+import mmap
+import operator
+import os
+import threading
+
+try:
+    import numpy
+except ImportError:  # optional, without it searching falls back to plain Python on the same files
+    numpy = None
+
+
+def normalize(vector) -> array.array:
+    norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+    return array.array("f", (x / norm for x in vector))
+
+
+def _dot(a, b) -> float:
+    return sum(map(operator.mul, a, b))
+
+
+_dot = getattr(math, "sumprod", _dot)  # Python 3.12+
+
+
+class VectorIndex:
+    """Top-k cosine similarity search over embedding vectors.
+
+    Vectors are normalized and appended as float32 rows to path + ".f32", their items (any JSON
+    object, e.g. a text and where it came from) as lines to path + ".jsonl" after a header line with
+    the dimension and `info`. For searching, the vector file is memory-mapped instead of read, and
+    with NumPy installed a search is a single matrix-vector product. Without a path the index only
+    lives in memory.
+    """
+    def __init__(self, path: str = None, info: dict = None) -> None:
+        self.path = path
+        self.dim = None
+        self.info = dict(info or {})  # e.g. the embedding model, stored in the header
+        self.items = []
+        self._memory = array.array("f")  # vectors of an in-memory index
+        self._file = None
+        self._map = None
+        self._lock = threading.Lock()
+        if path is not None and os.path.exists(path + ".jsonl"):
+            self._load()
+
+    def _load(self) -> None:
+        with open(self.path + ".jsonl", encoding="utf-8") as file:
+            header = json.loads(file.readline())
+            self.items = [json.loads(line) for line in file if line.strip()]
+        self.dim = header.pop("dim")
+        self.info = header
+        # drop vectors without an item, e.g. from an interrupted add()
+        size = len(self.items) * self.dim * 4
+        if os.path.exists(self.path + ".f32") and os.path.getsize(self.path + ".f32") > size:
+            with open(self.path + ".f32", "r+b") as file:
+                file.truncate(size)
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def add(self, vectors: list, items: list) -> None:
+        if len(vectors) != len(items):
+            raise ValueError("add() needs one item per vector")
+        if not vectors:
+            return
+        with self._lock:
+            dim = self.dim or len(vectors[0])
+            rows = array.array("f")
+            for vector in vectors:
+                if len(vector) != dim:
+                    raise ValueError(f"Vectors must have dimension {dim}, got {len(vector)}")
+                rows.extend(normalize(vector))
+            if self.path is None:
+                self._memory.extend(rows)
+            else:
+                if self.dim is None:
+                    with open(self.path + ".jsonl", "w", encoding="utf-8") as file:
+                        file.write(json.dumps({"dim": dim, **self.info}) + "\n")
+                self._unmap()  # the mapping only covers the old file size
+                # vectors first, so an interrupted add leaves vectors without items (dropped on load)
+                with open(self.path + ".f32", "ab") as file:
+                    rows.tofile(file)
+                with open(self.path + ".jsonl", "a", encoding="utf-8") as file:
+                    file.writelines(json.dumps(item, ensure_ascii=False) + "\n" for item in items)
+            self.dim = dim
+            self.items.extend(items)
+
+    def _buffer(self):
+        # all vectors as a buffer of float32 values, memory-mapped for a persistent index
+        if self.path is None:
+            return self._memory
+        if self._map is None:
+            self._file = open(self.path + ".f32", "rb")
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._map
+
+    def search(self, vector, k: int = 5) -> list:
+        """The k items most similar to vector as [(cosine similarity, item), ...], best first."""
+        with self._lock:
+            count = len(self.items)
+            if count == 0 or k <= 0:
+                return []
+            if len(vector) != self.dim:
+                raise ValueError(f"Query must have dimension {self.dim}, got {len(vector)}")
+            query = normalize(vector)
+            dim = self.dim
+            if numpy is not None:
+                matrix = numpy.frombuffer(self._buffer(), dtype=numpy.float32, count=count * dim).reshape(count, dim)
+                scores = matrix @ numpy.frombuffer(query, dtype=numpy.float32)
+                del matrix  # release the buffer of the mapping
+                top = numpy.argpartition(-scores, k - 1)[:k] if k < count else range(count)
+                best = sorted(((float(scores[i]), int(i)) for i in top), reverse=True)
+            else:
+                with memoryview(self._buffer()) as raw, (raw if raw.format == "f" else raw.cast("f")) as rows:
+                    best = heapq.nlargest(k, ((_dot(rows[i * dim:(i + 1) * dim], query), i) for i in range(count)))
+            return [(score, self.items[i]) for score, i in best]
+
+    def _unmap(self) -> None:
+        if self._map is not None:
+            self._map.close()
+            self._file.close()
+            self._map = self._file = None
+
+    def close(self) -> None:
+        with self._lock:
+            self._unmap()
+
+
+def chunk_text(text: str, size: int = 1000, overlap: int = 200) -> list:
+    """Split text into chunks of about size characters, overlapping by about overlap characters.
+
+    Chunks end at a paragraph, line or word boundary where possible.
+    """
+    text = text.strip()
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = min(len(text), start + size)
+        if end < len(text):
+            for separator in ("\n\n", "\n", " "):
+                boundary = text.rfind(separator, start + size // 2, end)
+                if boundary != -1:
+                    end = boundary
+                    break
+        if chunk := text[start:end].strip():
+            chunks.append(chunk)
+        if end >= len(text):
+            break
+        start = max(start + 1, end - overlap)
+    return chunks
+
+
+class KnowledgeBase:
+    """Retrieval-augmented prompts from documents and chat history without a vector database.
+
+    Texts are split into chunks, embedded with an Ollama embedding model (client.embed, batched)
+    and kept in a VectorIndex. augment() prepends the chunks most similar to a prompt.
+    """
+    def __init__(self, client, index: VectorIndex, model: str = "nomic-embed-text", indexing_client=None) -> None:
+        self.client = client  # OllamaClient or OllamaRouter
+        # embeds the texts that are added, e.g. a client with BACKGROUND priority so queries go first
+        self.indexing_client = indexing_client or client
+        self.index = index
+        # an index can only be searched with the model it was built with
+        self.model = index.info.setdefault("model", model)
+
+    def add(self, texts: list, items: list) -> int:
+        if not texts:
+            return 0
+        embeddings = self.indexing_client.embed(self.model, texts)["embeddings"]
+        self.index.add(embeddings, [{"text": text, **item} for text, item in zip(texts, items)])
+        return len(texts)
+
+    def add_text(self, text: str, source: str) -> int:
+        """Index a document; returns the number of chunks."""
+        chunks = chunk_text(text)
+        return self.add(chunks, [{"source": source} for _ in chunks])
+
+    def add_file(self, path: str) -> int:
+        with open(path, encoding="utf-8", errors="replace") as file:
+            return self.add_text(file.read(), os.path.basename(path))
+
+    def add_messages(self, messages: list) -> int:
+        """Index stored chat messages (dicts with id, session_id, role and content, see SessionStore)."""
+        texts, items = [], []
+        for message in messages:
+            for chunk in chunk_text(message["content"]):
+                texts.append(chunk)
+                items.append({"source": f"chat {message['session_id']}", "message_id": message["id"]})
+        return self.add(texts, items)
+
+    def last_message_id(self) -> int:
+        """Id of the newest indexed chat message, to continue indexing the history from there."""
+        return max((item["message_id"] for item in self.index.items if "message_id" in item), default=0)
+
+    def search(self, query: str, k: int = 4) -> list:
+        if not len(self.index):
+            return []
+        return self.index.search(self.client.embed(self.model, query)["embeddings"][0], k)
+
+    def context(self, prompt: str, k: int = 4, min_score: float = 0.3) -> str:
+        """Instructions with the k indexed chunks most similar to prompt, "" if nothing matches.
+
+        Meant to be sent along with the prompt, e.g. as a system message (see Ollama.chat's retrieved).
+        """
+        hits = [item for score, item in self.search(prompt, k) if score >= min_score]
+        if not hits:
+            return ""
+        context = "\n\n".join(f"[{item['source']}]\n{item['text']}" for item in hits)
+        return f"Answer using the following context where it is relevant.\n\nContext:\n{context}"
+
+    def augment(self, prompt: str, k: int = 4, min_score: float = 0.3) -> str:
+        """The prompt with the k most similar indexed chunks as context (unchanged if nothing matches)."""
+        context = self.context(prompt, k, min_score)
+        return f"{context}\n\nQuestion: {prompt}" if context else prompt
@@ -0,0 +1,201 @@
+"""Benchmark: OllamaClient, AsyncOllamaClient and Ollama against a local fake Ollama server.
+
+Measures token throughput, time to first token (p50/p95), client CPU time per token and peak
+Python memory per client. The fake server runs in a subprocess, so CPU numbers only contain the
+client side. Every run is appended to benchmarks/results.jsonl together with the git revision, and
+--compare prints the change against the last run of another revision.
+
+Run from the repository root: python benchmarks/bench_clients.py [--requests N] [--concurrency C]
+    [--tokens T] [--token-size S] [--rate R] [--latency L] [--compare]
+"""
+import argparse
+import asyncio
+import concurrent.futures
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+from Ollama import Ollama, OllamaClient, AsyncOllamaClient, percentile
+from fake_ollama import add_server_arguments
+
+RESULTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results.jsonl")
+MESSAGES = [{"role": "user", "content": "Tell me a story."}]
+
+
+def start_server(args) -> tuple:
+    # the server gets its own process so its CPU time does not show up in the measurements
+    command = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_ollama.py"),
+               "--port", "0", "--tokens", str(args.tokens), "--token-size", str(args.token_size),
+               "--rate", str(args.rate), "--latency", str(args.latency)]
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    base_url = process.stdout.readline().split()[-1]
+    return process, base_url
+
+
+def run_sync(client: OllamaClient, model: str) -> tuple:
+    start = time.perf_counter()
+    ttft, tokens = None, 0
+    for partial_response in client.chat_stream(model, MESSAGES):
+        if partial_response["message"]["content"]:
+            if ttft is None:
+                ttft = time.perf_counter() - start
+            tokens += 1
+    return ttft, tokens
+
+
+async def run_async(client: AsyncOllamaClient, model: str) -> tuple:
+    start = time.perf_counter()
+    ttft, tokens = None, 0
+    async for partial_response in client.chat(model, MESSAGES, stream=True):
+        if partial_response["message"]["content"]:
+            if ttft is None:
+                ttft = time.perf_counter() - start
+            tokens += 1
+    return ttft, tokens
+
+
+def run_model(ollama: Ollama) -> tuple:
+    ollama.reset()  # the same prompt every time, like the client benchmarks
+    start = time.perf_counter()
+    ttft, tokens = None, 0
+    for token in ollama.chat_stream(MESSAGES[0]["content"]):
+        if token:
+            if ttft is None:
+                ttft = time.perf_counter() - start
+            tokens += 1
+    return ttft, tokens
+
+
+def bench_client(base_url: str, requests: int, concurrency: int) -> list:
+    client = OllamaClient(base_url)
+    client._pool.ensure_size(concurrency)
+    with concurrent.futures.ThreadPoolExecutor(concurrency) as executor:
+        return list(executor.map(lambda _: run_sync(client, "llama3"), range(requests)))
+
+
+def bench_async_client(base_url: str, requests: int, concurrency: int) -> list:
+    async def run_all():
+        client = AsyncOllamaClient(base_url)
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def limited():
+            async with semaphore:
+                return await run_async(client, "llama3")
+        return await asyncio.gather(*(limited() for _ in range(requests)))
+    return asyncio.run(run_all())
+
+
+def bench_model(base_url: str, requests: int, concurrency: int) -> list:
+    # Ollama keeps one conversation, so its requests run one after another
+    ollama = Ollama("llama3", base_url=base_url)
+    return [run_model(ollama) for _ in range(requests)]
+
+
+BENCHMARKS = {"OllamaClient": bench_client, "AsyncOllamaClient": bench_async_client, "Ollama": bench_model}
+
+
+def measure(bench, base_url: str, args) -> dict:
+    bench(base_url, min(args.requests, 4), args.concurrency)  # warm up connections and imports
+    cpu, start = time.process_time(), time.perf_counter()
+    results = bench(base_url, args.requests, args.concurrency)
+    elapsed, cpu = time.perf_counter() - start, time.process_time() - cpu
+    ttfts = [ttft for ttft, _ in results if ttft is not None]
+    tokens = sum(count for _, count in results)
+    # memory in a separate, shorter pass since tracing slows everything down
+    tracemalloc.start()
+    bench(base_url, min(args.requests, 2 * args.concurrency), args.concurrency)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {
+        "requests": len(results),
+        "tokens": tokens,
+        "elapsed": elapsed,
+        "tokens_per_second": tokens / elapsed if elapsed else 0.0,
+        "ttft_p50": percentile(ttfts, 50),
+        "ttft_p95": percentile(ttfts, 95),
+        "cpu_us_per_token": cpu / tokens * 1e6 if tokens else 0.0,
+        "peak_kib": peak / 1024,
+    }
+
+
+def git_revision() -> tuple:
+    try:
+        rev = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                             text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT,
+                                    capture_output=True, text=True).stdout.strip())
+        return rev, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return None, False
+
+
+def load_history(path: str) -> list:
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+def compare(entry: dict, history: list) -> None:
+    # last run of another revision with the same settings
+    previous = next((old for old in reversed(history)
+                     if old["config"] == entry["config"] and old["rev"] != entry["rev"]), None)
+    if previous is None:
+        print("no earlier run with these settings to compare with")
+        return
+    print(f"\nchange against {previous['rev']}:")
+    for name, result in entry["results"].items():
+        old = previous["results"].get(name)
+        if not old:
+            continue
+        changes = "  ".join(f"{key} {100 * (result[key] / old[key] - 1):+.1f}%"
+                            for key in ("tokens_per_second", "ttft_p50", "cpu_us_per_token", "peak_kib") if old[key])
+        print(f"{name:<18} {changes}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=4)
+    add_server_arguments(parser)
+    parser.add_argument("--only", choices=list(BENCHMARKS), nargs="+", help="run only these benchmarks")
+    parser.add_argument("--results", default=RESULTS, help="JSONL file the results are appended to")
+    parser.add_argument("--no-save", action="store_true", help="do not append this run to the results file")
+    parser.add_argument("--compare", action="store_true", help="compare with the last run of another revision")
+    args = parser.parse_args()
+
+    process, base_url = start_server(args)
+    try:
+        results = {}
+        print(f"{'':<18} {'tokens/s':>10} {'TTFT p50':>10} {'TTFT p95':>10} {'CPU/token':>10} {'peak mem':>10}")
+        for name in args.only or BENCHMARKS:
+            result = results[name] = measure(BENCHMARKS[name], base_url, args)
+            print(f"{name:<18} {result['tokens_per_second']:>10.0f} {result['ttft_p50'] * 1e3:>8.2f}ms "
+                  f"{result['ttft_p95'] * 1e3:>8.2f}ms {result['cpu_us_per_token']:>8.1f}us "
+                  f"{result['peak_kib']:>7.0f}KiB")
+    finally:
+        process.terminate()
+        process.wait()
+
+    rev, dirty = git_revision()
+    entry = {
+        "rev": rev,
+        "dirty": dirty,
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "config": {key: getattr(args, key) for key in ("requests", "concurrency", "tokens", "token_size", "rate",
+                                                       "latency")},
+        "results": results,
+    }
+    history = load_history(args.results)
+    if args.compare:
+        compare(entry, history)
+    if not args.no_save:
+        with open(args.results, "a", encoding="utf-8") as file:
+            file.write(json.dumps(entry) + "\n")
@@ -0,0 +1,65 @@
+"""Microbenchmark: NDJSON stream decoding, byte-at-a-time loop vs. buffered NDJSONDecoder.
+
+Run from the repository root: python benchmarks/bench_ndjson.py [--frames N]
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from Ollama import iter_ndjson
+
+
+def make_stream(frames: int) -> bytes:
+    lines = []
+    for i in range(frames):
+        frame = {"model": "llama3", "created_at": "2024-05-01T12:00:00.000000Z",
+                 "message": {"role": "assistant", "content": f"tök{i} "}, "done": False}
+        lines.append(json.dumps(frame))
+    lines.append(json.dumps({"model": "llama3", "message": {"role": "assistant", "content": ""}, "done": True}))
+    return ("\n".join(lines) + "\n").encode()
+
+
+def legacy_loop(response) -> int:
+    # the loop AsyncOllamaClient used before NDJSONDecoder
+    count = 0
+    buffer = ""
+    while True:
+        chunk = response.read(1).decode()
+        if not chunk:
+            break
+        buffer += chunk
+        if buffer.endswith('\n'):
+            line = buffer.strip()
+            buffer = ""
+            json.loads(line)
+            count += 1
+    return count
+
+
+def buffered_decoder(response) -> int:
+    return sum(1 for _ in iter_ndjson(response))
+
+
+def bench(name: str, func, payload: bytes, repeat: int) -> None:
+    best = float("inf")
+    for _ in range(repeat):
+        response = io.BufferedReader(io.BytesIO(payload))
+        start = time.perf_counter()
+        count = func(response)
+        best = min(best, time.perf_counter() - start)
+    print(f"{name:<18} {count:>8} frames  {len(payload) / best / 1e6:>8.2f} MB/s  {best * 1e3:>8.2f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--frames", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    payload = make_stream(args.frames)
+    bench("read(1) loop", legacy_loop, payload, args.repeat)
+    bench("NDJSONDecoder", buffered_decoder, payload, args.repeat)
@@ -0,0 +1,97 @@
+"""Microbenchmark: client CPU per chat request over long histories, old vs. cached message encoding.
+
+"per-dict" is what every chat request did before Message: validate all messages and json.dumps the
+whole body. "Message" assembles the body from the encodings cached on the Conversation's messages,
+with the json module and (if installed) with orjson. Times are per request at the given history
+length, and summed over a whole conversation of --turns turns.
+
+Run from the repository root: python benchmarks/bench_serialization.py [--turns N]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import Ollama
+from Ollama import Conversation, OllamaClient, encode_body
+
+USER = "Can you explain how the KV cache speeds up generation? Please keep it short. "
+ASSISTANT = ("The KV cache keeps the attention keys and values of all earlier tokens, so for every new "
+             "token only its own keys and values are computed. Without it the whole prefix would be "
+             "processed again for each token – quadratic instead of linear work. ") * 2
+
+
+def legacy_body(model: str, messages: list) -> bytes:
+    # OllamaClient._chat_body and the json.dumps of the request before Message
+    for message in messages:
+        if not isinstance(message, dict):
+            raise TypeError("Messages must be a list of dict-like objects")
+        if not (role := message.get("role")) or role not in ["system", "user", "assistant"]:
+            raise ValueError('messages must contain a role and it must be one of "system", "user", or "assistant"')
+        if "content" not in message:
+            raise ValueError("Messages must contain content")
+    body = {"model": model, "messages": messages, "stream": True, "keep_alive": -1}
+    return json.dumps(body).encode()
+
+
+def cached_body(model: str, messages: list) -> bytes:
+    return encode_body(OllamaClient._chat_body(model, messages, True, -1))
+
+
+def conversation(turns: int, cached: bool):
+    # yields the request messages of each turn, like Ollama.chat_stream
+    history = Conversation("You are a helpful assistant.") if cached else None
+    messages = [{"role": "system", "content": "You are a helpful assistant."}]
+    for turn in range(turns):
+        prompt = {"role": "user", "content": f"{USER}({turn})"}
+        answer = {"role": "assistant", "content": ASSISTANT}
+        if cached:
+            history.append(prompt)
+            yield history.window()
+            history.append(answer)
+        else:
+            messages.append(prompt)
+            yield list(messages)
+            messages.append(answer)
+
+
+def per_request(encode, turns: int, cached: bool, repeat: int) -> float:
+    *_, messages = conversation(turns, cached)
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        encode("llama3", messages)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def whole_conversation(encode, turns: int, cached: bool) -> float:
+    # CPU of all requests including appending the messages (the Conversation encodes them once there)
+    start = time.process_time()
+    for messages in conversation(turns, cached):
+        encode("llama3", messages)
+    return time.process_time() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, default=1000, help="turns (user prompt and answer) of the history")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    orjson = Ollama.orjson
+    variants = [("per-dict json", legacy_body, False, None), ("Message json", cached_body, True, None)]
+    if orjson is not None:
+        variants.append(("Message orjson", cached_body, True, orjson))
+    lengths = sorted({10, 100, args.turns})
+    body = legacy_body("llama3", list(conversation(args.turns, False))[-1])
+    print(f"request body at {args.turns} turns: {len(body) / 1024:.0f} KiB")
+    print(f"{'':<16}" + "".join(f"{f'{n} turns':>14}" for n in lengths) + f"{'conversation':>16}")
+    for name, encode, cached, backend in variants:
+        Ollama.orjson = backend  # messages are encoded when they are created, so per variant
+        times = [per_request(encode, n, cached, args.repeat) for n in lengths]
+        total = whole_conversation(encode, args.turns, cached)
+        print(f"{name:<16}" + "".join(f"{t * 1e6:>12.0f}us" for t in times) + f"{total * 1e3:>14.0f}ms")
+    Ollama.orjson = orjson
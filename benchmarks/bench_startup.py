@@ -0,0 +1,118 @@
+"""Measure ChatApp startup: import time, window construction, time to first paint and backend ready.
+
+Every sample runs in a fresh interpreter. Import times are measured headless; the window timings
+need a display (no Ollama server is needed, the backend only imports modules and opens the session
+store). Results are appended to benchmarks/startup_results.jsonl with the git revision, and the
+--max-* options make the script fail when startup got slower than a budget, e.g. in CI.
+
+Run from the repository root: python benchmarks/bench_startup.py [--runs N] [--max-first-paint MS]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+RESULTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "startup_results.jsonl")
+from bench_clients import git_revision, load_history
+
+# runs in the child interpreter, times are in ms since the probe started
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+ms = lambda: (time.perf_counter() - start) * 1e3
+sys.path.insert(0, {root!r})
+import ChatApp
+result = {{"import": ms()}}
+try:
+    app = ChatApp.ChatApp()
+except Exception as e:  # e.g. no display
+    result["error"] = str(e)
+    print(json.dumps(result))
+    sys.exit()
+result["construct"] = ms()
+
+def painted(event):
+    if "first_paint" in result:
+        return
+    result["first_paint"] = ms()
+    app.ensure_backend()  # waits for the background setup started by run()
+    result["backend_ready"] = ms()
+    app.root.after_idle(app.root.destroy)
+
+app.root.bind("<Expose>", painted, add="+")
+app.run()
+print(json.dumps(result))
+"""
+
+
+def import_profile(top: int) -> tuple:
+    """Cumulative import time of ChatApp and its slowest imports (in ms), from python -X importtime."""
+    stderr = subprocess.run([sys.executable, "-X", "importtime", "-c", "import ChatApp"], cwd=ROOT,
+                            capture_output=True, text=True).stderr
+    imports = []
+    for line in stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            _, cumulative, name = line[len("import time:"):].split("|")
+            if cumulative.strip().isdigit():
+                imports.append((name.rstrip(), int(cumulative) / 1e3))
+    total = next((ms for name, ms in imports if name.strip() == "ChatApp"), 0.0)
+    # only direct imports of ChatApp and its top level dependencies are indented by one level
+    direct = [(name.strip(), ms) for name, ms in imports if name.startswith("  ") and not name.startswith("    ")]
+    return total, sorted(direct, key=lambda item: -item[1])[:top]
+
+
+def sample() -> dict:
+    start = time.perf_counter()
+    output = subprocess.run([sys.executable, "-c", PROBE.format(root=ROOT)], cwd=ROOT, capture_output=True,
+                            text=True, timeout=60).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    result["process"] = (time.perf_counter() - start) * 1e3  # including interpreter startup and shutdown
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=5, help="number of slowest imports to list")
+    parser.add_argument("--max-import", type=float, help="fail if the median import time exceeds this (ms)")
+    parser.add_argument("--max-first-paint", type=float, help="fail if the median time to first paint exceeds this (ms)")
+    parser.add_argument("--results", default=RESULTS, help="JSONL file the results are appended to")
+    parser.add_argument("--no-save", action="store_true", help="do not append this run to the results file")
+    args = parser.parse_args()
+
+    total, slowest = import_profile(args.top)
+    print(f"import ChatApp: {total:.1f} ms (cumulative), slowest imports:")
+    for name, ms in slowest:
+        print(f"  {name:<30} {ms:>8.1f} ms")
+
+    samples = [sample() for _ in range(args.runs)]
+    if "error" in samples[0]:
+        print(f"window timings skipped: {samples[0]['error']}")
+    medians = {key: statistics.median(s[key] for s in samples) for key in samples[0] if key != "error"}
+    for key, label in (("import", "import"), ("construct", "window built"), ("first_paint", "first paint"),
+                       ("backend_ready", "backend ready"), ("process", "whole process")):
+        if key in medians:
+            print(f"{label:<16} {medians[key]:>8.1f} ms (median of {len(samples)})")
+
+    rev, dirty = git_revision()
+    history = load_history(args.results)
+    previous = next((old for old in reversed(history) if old["rev"] != rev), None)
+    if previous is not None:
+        changes = "  ".join(f"{key} {value - previous['results'][key]:+.1f} ms" for key, value in medians.items()
+                            if key in previous["results"])
+        print(f"change against {previous['rev']}: {changes}")
+    if not args.no_save:
+        with open(args.results, "a", encoding="utf-8") as file:
+            file.write(json.dumps({"rev": rev, "dirty": dirty, "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                                   "python": sys.version.split()[0], "results": medians}) + "\n")
+
+    failed = [f"{key} {medians[key]:.1f} ms > {limit} ms" for key, limit in
+              (("import", args.max_import), ("first_paint", args.max_first_paint))
+              if limit is not None and key in medians and medians[key] > limit]
+    if failed:
+        print("startup budget exceeded: " + ", ".join(failed))
+        sys.exit(1)
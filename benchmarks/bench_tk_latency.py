@@ -0,0 +1,119 @@
+"""Measure the latency the GUI adds between a token arriving and it being rendered, plus idle CPU.
+
+Compares the AsyncioThread/UIDispatcher bridge used by AsyncChatApp with the former approach of
+pumping the asyncio loop from Tk every 100 ms. Needs a display.
+
+Run from the repository root: python benchmarks/bench_tk_latency.py [--tokens N] [--rate HZ]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+import tkinter as tk
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from ChatApp import AsyncioThread, UIDispatcher
+
+
+async def produce(tokens: int, rate: float, deliver) -> None:
+    # emit tokens on a fixed schedule; deliver(arrival) hands a token to the UI
+    start = time.perf_counter()
+    for i in range(tokens):
+        arrival = start + i / rate
+        await asyncio.sleep(max(0.0, arrival - time.perf_counter()))
+        deliver(arrival)
+
+
+def run_bridge(root: tk.Tk, text: tk.Text, tokens: int, rate: float) -> list:
+    latencies = []
+    ui = UIDispatcher(root)
+    loop_thread = AsyncioThread()
+
+    def record(arrival):
+        text.insert(tk.END, "tok ")
+        latencies.append(time.perf_counter() - arrival)
+
+    future = loop_thread.submit(produce(tokens, rate, lambda arrival: ui.call(record, arrival)))
+    future.add_done_callback(lambda _: ui.call(root.quit))
+    root.mainloop()
+    loop_thread.stop()
+    return latencies
+
+
+def run_polling(root: tk.Tk, text: tk.Text, tokens: int, rate: float) -> list:
+    latencies = []
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+
+    def record(arrival):
+        text.insert(tk.END, "tok ")
+        latencies.append(time.perf_counter() - arrival)
+
+    task = loop.create_task(produce(tokens, rate, record))
+
+    def pump():
+        loop.run_until_complete(asyncio.sleep(0))
+        if task.done():
+            root.quit()
+        else:
+            root.after(100, pump)
+
+    root.after(100, pump)
+    root.mainloop()
+    loop.close()
+    return latencies
+
+
+def idle_cpu(root: tk.Tk, setup, seconds: float) -> float:
+    # CPU seconds per wall second while the app is idle
+    cleanup = setup()
+    root.update()
+    start_cpu, start_wall = time.process_time(), time.perf_counter()
+    root.after(int(seconds * 1000), root.quit)
+    root.mainloop()
+    usage = (time.process_time() - start_cpu) / (time.perf_counter() - start_wall)
+    cleanup()
+    return usage
+
+
+def setup_bridge(root):
+    UIDispatcher(root)
+    loop_thread = AsyncioThread()
+    return loop_thread.stop
+
+
+def setup_polling(root):
+    loop = asyncio.new_event_loop()
+    state = {"running": True}
+
+    def pump():
+        if state["running"]:
+            loop.run_until_complete(asyncio.sleep(0))
+            root.after(100, pump)
+
+    root.after(100, pump)
+    return lambda: state.update(running=False)
+
+
+def report(name: str, latencies: list, cpu: float) -> None:
+    latencies = sorted(latencies)
+    p95 = latencies[int(0.95 * (len(latencies) - 1))]
+    print(f"{name:<8} tokens={len(latencies):>5}  p50={statistics.median(latencies) * 1e3:>7.2f} ms  "
+          f"p95={p95 * 1e3:>7.2f} ms  max={latencies[-1] * 1e3:>7.2f} ms  idle CPU={cpu * 100:>5.2f} %")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tokens", type=int, default=300)
+    parser.add_argument("--rate", type=float, default=100.0, help="tokens per second")
+    parser.add_argument("--idle", type=float, default=2.0, help="seconds to sample idle CPU")
+    args = parser.parse_args()
+
+    root = tk.Tk()
+    text = tk.Text(root)
+    text.pack()
+    report("bridge", run_bridge(root, text, args.tokens, args.rate), idle_cpu(root, lambda: setup_bridge(root), args.idle))
+    report("polling", run_polling(root, text, args.tokens, args.rate), idle_cpu(root, lambda: setup_polling(root), args.idle))
+    root.destroy()
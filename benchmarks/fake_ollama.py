@@ -0,0 +1,151 @@
+"""A local stand-in for the Ollama server with configurable token rate, token size and latency.
+
+It answers /api/tags, /api/ps, /api/chat and /api/generate (streamed as chunked NDJSON or as one
+JSON object) with generated tokens and realistic done frame stats, so the client and GUI code paths
+can be measured without a model. Used by bench_clients.py, or run it standalone and point the GUI
+at it: python benchmarks/fake_ollama.py --port 11434 --rate 50
+"""
+import argparse
+import json
+import socket
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like Ollama
+
+    def setup(self) -> None:
+        super().setup()
+        # like Ollama (Go sets TCP_NODELAY by default), otherwise Nagle delays small token frames
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+    def _send_json(self, payload: dict) -> None:
+        body = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self) -> None:
+        if self.path in ("/api/tags", "/api/ps"):
+            models = [{"name": f"{name}:latest", "model": f"{name}:latest", "size": 4_000_000_000,
+                       "size_vram": 4_000_000_000} for name in self.server.models]
+            self._send_json({"models": models})
+        else:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+    def do_POST(self) -> None:
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if self.path not in ("/api/chat", "/api/generate"):
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        server = self.server
+        if server.error_status or request.get("model", "").split(":latest")[0] not in server.models:
+            # like Ollama, an unknown model is a 404
+            self.send_response(server.error_status or 404)
+            body = json.dumps({"error": f"model '{request.get('model')}' not found"}).encode()
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        chat = self.path == "/api/chat"
+        started = time.perf_counter_ns()
+
+        def frame(text: str, done: bool) -> dict:
+            payload = {"model": request.get("model"), "created_at": "2024-05-01T12:00:00.000000Z", "done": done}
+            if chat:
+                payload["message"] = {"role": "assistant", "content": text}
+            else:
+                payload["response"] = text
+            if done:
+                elapsed = time.perf_counter_ns() - started
+                prompt_eval = int(server.latency * 1e9)
+                payload.update(done_reason="stop", total_duration=elapsed, load_duration=0,
+                               prompt_eval_count=len(json.dumps(request)) // 4, prompt_eval_duration=prompt_eval,
+                               eval_count=server.tokens, eval_duration=max(0, elapsed - prompt_eval))
+                if not chat:
+                    payload["context"] = [1, 2, 3]
+            return payload
+
+        token = "x" * (server.token_size - 1) + " "
+        time.sleep(server.latency)  # prompt evaluation
+        if not request.get("stream", True):
+            if server.rate:
+                time.sleep(server.tokens / server.rate)
+            self._send_json(frame(token * server.tokens, True))
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        interval = 1.0 / server.rate if server.rate else 0.0
+        next_token = time.perf_counter()
+        for i in range(server.tokens + 1):
+            if interval:
+                next_token += interval
+                time.sleep(max(0.0, next_token - time.perf_counter()))
+            done = i == server.tokens
+            line = (json.dumps(frame("" if done else token, done)) + "\n").encode()
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(line), line))
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+
+class FakeOllamaServer(ThreadingHTTPServer):
+    """Fake server; tokens per answer, token_size in characters, rate in tokens/s (0 = unthrottled),
+    latency in seconds before the first token. With error_status set, every POST fails with it."""
+    daemon_threads = True
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, tokens: int = 200, token_size: int = 4,
+                 rate: float = 0.0, latency: float = 0.0, models: tuple = ("llama3",)) -> None:
+        super().__init__((host, port), FakeOllamaHandler)
+        self.tokens = tokens
+        self.token_size = max(1, token_size)
+        self.rate = rate
+        self.latency = latency
+        self.models = models
+        self.error_status = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.server_address[0]}:{self.server_address[1]}"
+
+    def start(self) -> "FakeOllamaServer":
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+def add_server_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--tokens", type=int, default=200, help="tokens per answer")
+    parser.add_argument("--token-size", type=int, default=4, help="characters per token")
+    parser.add_argument("--rate", type=float, default=0.0, help="tokens per second per request, 0 = unthrottled")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds before the first token")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--models", nargs="+", default=["llama3"])
+    add_server_arguments(parser)
+    args = parser.parse_args()
+
+    server = FakeOllamaServer(args.host, args.port, args.tokens, args.token_size, args.rate, args.latency,
+                              tuple(args.models))
+    print(f"fake Ollama listening on {server.base_url}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
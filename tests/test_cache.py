@@ -0,0 +1,123 @@
+"""ResponseCache tiers, TTL and disk trimming, also in front of a local fake Ollama server (benchmarks/fake_ollama.py).
+
+Run from the repository root: python -m pytest tests
+"""
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+from Ollama import OllamaClient, ResponseCache
+from fake_ollama import FakeOllamaServer
+
+DETERMINISTIC = {"temperature": 0}
+
+
+def stored_bytes(cache: ResponseCache) -> int:
+    return cache._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+
+class ResponseCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "cache.sqlite")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_only_deterministic_requests_are_cacheable(self):
+        cache = ResponseCache()
+        self.assertTrue(cache.cacheable({"options": DETERMINISTIC}))
+        self.assertTrue(cache.cacheable({"options": {"seed": 1}}))
+        self.assertFalse(cache.cacheable({"options": {"temperature": 0.8}}))
+        self.assertTrue(ResponseCache(deterministic_only=False).cacheable({}))
+
+    def test_key_ignores_stream_and_keep_alive(self):
+        cache = ResponseCache()
+        body = {"model": "llama3", "prompt": "hi", "options": DETERMINISTIC}
+        self.assertEqual(cache.key("/api/generate", body), cache.key("/api/generate", dict(body, stream=False, keep_alive=-1)))
+        self.assertNotEqual(cache.key("/api/generate", body), cache.key("/api/chat", body))
+
+    def test_memory_lru(self):
+        cache = ResponseCache(maxsize=2)
+        for key in "abc":
+            cache.put(key, {"response": key})
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.get("c"), {"response": "c"})
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_ttl(self):
+        cache = ResponseCache(path=self.path, ttl=0.2)
+        cache.put("a", {"response": "a"})
+        self.assertEqual(cache.get("a"), {"response": "a"})
+        time.sleep(0.3)
+        self.assertIsNone(cache.get("a"))
+        # the expired row is gone from the disk tier as well
+        self.assertEqual(stored_bytes(cache), 0)
+        self.assertEqual(cache._bytes, 0)
+        cache.close()
+
+    def test_disk_tier_survives_reopen(self):
+        cache = ResponseCache(path=self.path)
+        cache.put("a", {"response": "a"})
+        cache.close()
+        cache = ResponseCache(path=self.path)
+        self.assertEqual(cache.get("a"), {"response": "a"})
+        self.assertEqual(cache.disk_hits, 1)
+        self.assertEqual(cache._bytes, stored_bytes(cache))
+        cache.close()
+
+    def test_disk_trimmed_least_recently_used_first(self):
+        value = {"response": "x" * 100}
+        size = len(json.dumps(value).encode())  # as stored
+        cache = ResponseCache(maxsize=1, path=self.path, max_bytes=3 * size)
+        for key in "abc":
+            cache.put(key, value)
+            time.sleep(0.01)
+        cache.get("a")  # from disk, a is now more recently used than b
+        cache.put("d", value)
+        self.assertIsNone(cache.get("b"))
+        for key in "acd":
+            self.assertEqual(cache.get(key), value)
+        self.assertLessEqual(stored_bytes(cache), 3 * size)
+        self.assertEqual(cache._bytes, stored_bytes(cache))
+        cache.close()
+
+    def test_running_total_follows_replace_and_clear(self):
+        cache = ResponseCache(path=self.path)
+        cache.put("a", {"response": "short"})
+        cache.put("a", {"response": "a longer response"})
+        cache.put("b", {"response": "b"})
+        self.assertEqual(cache._bytes, stored_bytes(cache))
+        cache.clear()
+        self.assertEqual((cache._bytes, stored_bytes(cache)), (0, 0))
+        cache.close()
+
+
+class CachedClientTest(unittest.TestCase):
+    def setUp(self):
+        self.server = FakeOllamaServer(tokens=3, latency=0.3).start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_repeated_deterministic_request_is_not_sent(self):
+        cache = ResponseCache()
+        client = OllamaClient(self.server.base_url, cache=cache, timeout=5)
+        first = client.generate("llama3", "hi", options=DETERMINISTIC)
+        started = time.monotonic()
+        self.assertEqual(client.generate("llama3", "hi", options=DETERMINISTIC), first)
+        self.assertLess(time.monotonic() - started, 0.2)  # not the server's latency
+        client.generate("llama3", "hi", options={"temperature": 0.8})
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
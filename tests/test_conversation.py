@@ -0,0 +1,154 @@
+"""Conversation token window: sliding, summaries and pop, also through Ollama against a local fake
+Ollama server (benchmarks/fake_ollama.py).
+
+Run from the repository root: python -m pytest tests
+"""
+import os
+import sys
+import unittest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+from Ollama import CancelToken, Conversation, Ollama, estimate_tokens
+from fake_ollama import FakeOllamaServer
+
+
+def contents(messages) -> list:
+    return [message["content"] for message in messages]
+
+
+def chat(conversation, turns: int) -> None:
+    # turns of a short prompt and answer, with a request window per prompt like Ollama.chat
+    for turn in range(turns):
+        conversation.append({"role": "user", "content": f"q{turn}"})
+        conversation.window()
+        conversation.append({"role": "assistant", "content": f"a{turn}"})
+
+
+class ConversationTest(unittest.TestCase):
+    def test_unbounded_window_is_whole_history(self):
+        conversation = Conversation("system")
+        chat(conversation, 20)
+        self.assertEqual(len(conversation.window()), 41)
+        self.assertEqual(conversation.last_request_tokens, sum(estimate_tokens(m) for m in conversation.messages))
+
+    def test_window_slides_within_budget(self):
+        conversation = Conversation("system", max_tokens=30)
+        chat(conversation, 12)
+        window = conversation.window()
+        self.assertEqual(contents(window), ["system", "q9", "a9", "q10", "a10", "q11", "a11"])
+        self.assertLessEqual(conversation.last_request_tokens, 30)
+        self.assertEqual(len(conversation.messages), 25)  # evicted messages are kept
+
+    def test_window_does_not_start_with_answer(self):
+        conversation = Conversation("system", max_tokens=20)
+        chat(conversation, 4)
+        conversation.append({"role": "user", "content": "x" * 20})
+        window = conversation.window()
+        self.assertEqual(window[1]["role"], "user")
+
+    def test_newest_message_is_never_evicted(self):
+        conversation = Conversation("system", max_tokens=10)
+        conversation.append({"role": "user", "content": "x" * 400})
+        self.assertEqual(contents(conversation.window()), ["system", "x" * 400])
+
+    def test_summary_of_evicted_turns(self):
+        calls = []
+
+        def summarizer(summary, evicted):
+            calls.append((summary, contents(evicted)))
+            return f"summary {len(calls)}"
+
+        conversation = Conversation("system", max_tokens=60, summarizer=summarizer)
+        chat(conversation, 12)
+        window = conversation.window()
+        self.assertEqual(window[0]["content"], "system")
+        self.assertEqual(window[1]["role"], "system")
+        self.assertIn(f"summary {len(calls)}", window[1]["content"])
+        self.assertLessEqual(conversation.last_request_tokens, 60)
+        # every evicted message is summarized exactly once, the previous summary is passed on
+        evicted = [content for _, batch in calls for content in batch]
+        self.assertEqual(evicted, contents(conversation.messages[1:1 + len(evicted)]))
+        self.assertEqual([summary for summary, _ in calls], [None] + [f"summary {n}" for n in range(1, len(calls))])
+
+    def test_pop_restores_window(self):
+        conversation = Conversation("system", max_tokens=30)
+        chat(conversation, 12)
+        before = contents(conversation.window())
+        conversation.append({"role": "user", "content": "x" * 400})
+        self.assertEqual(contents(conversation.window()), ["system", "x" * 400])
+        self.assertEqual(conversation.pop()["content"], "x" * 400)
+        self.assertEqual(contents(conversation.window()), before)
+        conversation.append({"role": "user", "content": "next"})
+        self.assertEqual(contents(conversation.window()), ["system", "q10", "a10", "q11", "a11", "next"])
+
+    def test_pop_restores_summary(self):
+        conversation = Conversation("system", max_tokens=60, summarizer=lambda summary, evicted: "short")
+        chat(conversation, 4)
+        self.assertIsNone(conversation.summary)
+        conversation.append({"role": "user", "content": "x" * 400})
+        conversation.window()
+        self.assertEqual(conversation.summary, "short")
+        conversation.pop()
+        self.assertIsNone(conversation.summary)
+        self.assertEqual(len(conversation.window()), 9)
+
+    def test_pop_notifies_listeners_and_keeps_system_prompt(self):
+        appended, popped = [], []
+        conversation = Conversation("system")
+        conversation.add_listener(appended.append, popped.append)
+        conversation.append({"role": "user", "content": "hi"})
+        conversation.pop()
+        self.assertEqual((contents(appended), contents(popped)), (["hi"], ["hi"]))
+        with self.assertRaises(IndexError):
+            conversation.pop()
+
+    def test_load_and_clear(self):
+        conversation = Conversation("system", max_tokens=30, summarizer=lambda summary, evicted: "s")
+        chat(conversation, 12)
+        conversation.load([{"role": "user", "content": "q"}, {"role": "assistant", "content": "a"}])
+        self.assertEqual(contents(conversation.window()), ["system", "q", "a"])
+        conversation.clear()
+        self.assertEqual(contents(conversation.window()), ["system"])
+        self.assertIsNone(conversation.summary)
+
+
+class OllamaConversationTest(unittest.TestCase):
+    def setUp(self):
+        self.server = FakeOllamaServer(tokens=20, token_size=8).start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_summarized_chat_stays_within_budget(self):
+        ollama = Ollama(system="system", base_url=self.server.base_url, max_context_tokens=200, summarize=True)
+        for turn in range(8):
+            self.assertTrue(ollama.chat(f"question {turn}"))
+        self.assertLessEqual(ollama.last_request_tokens, 200)
+        self.assertTrue(ollama.conversation.summary)
+        self.assertEqual(len(ollama.messages), 17)
+
+    def test_cancelled_prompt_is_removed(self):
+        ollama = Ollama(system="system", base_url=self.server.base_url, max_context_tokens=200)
+        ollama.chat("question")
+        before = contents(ollama.conversation.window())
+        cancel = CancelToken()
+        cancel.cancel()
+        self.assertEqual(list(ollama.chat_stream("x" * 2000, cancel=cancel)), [])
+        self.assertEqual(contents(ollama.conversation.window()), before)
+
+    def test_messages_is_a_copy_and_reset_clears(self):
+        ollama = Ollama(system="system", base_url=self.server.base_url)
+        ollama.chat("question")
+        ollama.messages.append({"role": "user", "content": "lost"})
+        self.assertEqual(len(ollama.messages), 3)
+        with self.assertRaises(AttributeError):
+            ollama.messages = []
+        ollama.reset()
+        self.assertEqual(ollama.messages, [{"role": "system", "content": "system"}])
+
+
+if __name__ == "__main__":
+    unittest.main()
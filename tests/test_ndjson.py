@@ -0,0 +1,97 @@
+"""NDJSON stream decoding, on raw blocks and on streams of a local fake Ollama server (benchmarks/fake_ollama.py).
+
+Run from the repository root: python -m pytest tests
+"""
+import asyncio
+import io
+import json
+import os
+import sys
+import unittest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+from Ollama import AsyncOllamaClient, NDJSONDecoder, OllamaClient, aiter_ndjson, iter_ndjson
+from fake_ollama import FakeOllamaServer
+
+FRAMES = [{"message": {"role": "assistant", "content": text}, "done": False} for text in ("Grüße", " 日本語", " 🦙", "")]
+STREAM = b"".join(json.dumps(frame, ensure_ascii=False).encode() + b"\n" for frame in FRAMES)
+
+
+def blocks(data: bytes, size: int) -> list:
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+async def async_blocks(data: bytes, size: int):
+    for block in blocks(data, size):
+        yield block
+
+
+class NDJSONDecoderTest(unittest.TestCase):
+    def decode(self, data: bytes, size: int) -> list:
+        decoder = NDJSONDecoder()
+        objects = [obj for block in blocks(data, size) for obj in decoder.feed(block)]
+        return objects + decoder.flush()
+
+    def test_utf8_split_across_reads(self):
+        # every block size splits some multi-byte character (up to 4 bytes for the emoji)
+        for size in (1, 2, 3, 5, 7, 64):
+            self.assertEqual(self.decode(STREAM, size), FRAMES, size)
+
+    def test_missing_trailing_newline(self):
+        self.assertEqual(self.decode(STREAM.rstrip(b"\n"), 3), FRAMES)
+        decoder = NDJSONDecoder()
+        self.assertEqual(decoder.feed(b'{"done": true}'), [])
+        self.assertEqual(decoder.flush(), [{"done": True}])
+        self.assertEqual(decoder.flush(), [])
+
+    def test_blank_lines_and_crlf(self):
+        data = b'\n{"a": 1}\r\n\r\n  \n{"b": 2}\n\n'
+        self.assertEqual(self.decode(data, 4), [{"a": 1}, {"b": 2}])
+
+    def test_several_objects_per_block(self):
+        decoder = NDJSONDecoder()
+        self.assertEqual(decoder.feed(STREAM + STREAM[:10]), FRAMES)
+        self.assertEqual(decoder.feed(STREAM[10:]) + decoder.flush(), FRAMES)
+
+    def test_invalid_line_raises(self):
+        with self.assertRaises(ValueError):
+            NDJSONDecoder().feed(b'{"a": \n')
+
+    def test_iter_ndjson(self):
+        self.assertEqual(list(iter_ndjson(io.BytesIO(STREAM.rstrip(b"\n")), block_size=3)), FRAMES)
+
+    def test_aiter_ndjson(self):
+        async def decode():
+            return [obj async for obj in aiter_ndjson(async_blocks(STREAM.rstrip(b"\n"), 3))]
+        self.assertEqual(asyncio.run(decode()), FRAMES)
+
+
+class StreamTest(unittest.TestCase):
+    def setUp(self):
+        self.server = FakeOllamaServer(tokens=50, token_size=3).start()
+        self.messages = [{"role": "user", "content": "hi"}]
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def check_stream(self, frames: list) -> None:
+        self.assertEqual(len(frames), 51)
+        self.assertEqual("".join(frame["message"]["content"] for frame in frames), "xx " * 50)
+        self.assertTrue(frames[-1]["done"])
+        self.assertEqual(frames[-1]["eval_count"], 50)
+
+    def test_client_stream(self):
+        self.check_stream(list(OllamaClient(self.server.base_url, timeout=5).chat_stream("llama3", self.messages)))
+
+    def test_async_client_stream(self):
+        async def stream():
+            client = AsyncOllamaClient(self.server.base_url, timeout=5)
+            return [frame async for frame in client.chat("llama3", self.messages, stream=True)]
+        self.check_stream(asyncio.run(stream()))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+"""ConnectionPool reuse, stale sockets and cancellation against a local fake Ollama server (benchmarks/fake_ollama.py).
+
+Run from the repository root: python -m pytest tests
+"""
+import os
+import sys
+import threading
+import time
+import unittest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+from Ollama import CancelToken, ConnectionPool, OllamaClient, RequestCancelled
+from fake_ollama import FakeOllamaHandler, FakeOllamaServer
+
+
+class ClosingHandler(FakeOllamaHandler):
+    # answers like a keep-alive server but closes the connection afterwards, i.e. every idle socket goes stale
+    def do_GET(self) -> None:
+        super().do_GET()
+        self.close_connection = True
+
+
+def get(pool: ConnectionPool, cancel: CancelToken = None):
+    connection, response = pool.request("GET", "/api/tags", cancel=cancel)
+    response.read()
+    pool.release(connection, response)
+    return connection, response
+
+
+class PoolTest(unittest.TestCase):
+    def setUp(self):
+        self.server = FakeOllamaServer(tokens=20, rate=20, latency=2).start()
+        self.pool = ConnectionPool(self.server.base_url, maxsize=1, timeout=5)
+
+    def tearDown(self):
+        self.pool.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_reuses_connection(self):
+        first, _ = get(self.pool)
+        second, response = get(self.pool)
+        self.assertIs(first, second)
+        self.assertEqual(response.status, 200)
+
+    def test_stale_socket_retried_on_new_connection(self):
+        self.server.RequestHandlerClass = ClosingHandler
+        first, _ = get(self.pool)
+        time.sleep(0.1)  # the server has closed the idle socket
+        # a socket the health check cannot see closing, e.g. closed by the server while it was being sent on
+        self.pool._is_healthy = lambda connection: True
+        second, response = get(self.pool)
+        self.assertIsNot(first, second)
+        self.assertEqual(response.status, 200)
+        get(self.pool)  # the slot of the stale connection was not lost
+
+    def test_unhealthy_idle_socket_is_replaced(self):
+        self.server.RequestHandlerClass = ClosingHandler
+        first, _ = get(self.pool)
+        time.sleep(0.1)
+        second, _ = get(self.pool)
+        self.assertIsNot(first, second)
+
+    def test_cancel_while_waiting_for_response(self):
+        cancel = CancelToken()
+        threading.Timer(0.2, cancel.cancel).start()
+        started = time.monotonic()
+        with self.assertRaises(RequestCancelled):
+            self.pool.request("POST", "/api/generate", b'{"model": "llama3", "prompt": "hi", "stream": false}',
+                              {"Content-type": "application/json"}, cancel)
+        self.assertLess(time.monotonic() - started, 1.5)  # not the server's latency
+        get(self.pool)  # the slot was released
+
+    def test_cancelled_before_sending(self):
+        cancel = CancelToken()
+        cancel.cancel()
+        with self.assertRaises(RequestCancelled):
+            get(self.pool, cancel)
+        get(self.pool)
+
+    def test_cancel_stream(self):
+        self.server.latency = 0
+        client = OllamaClient(self.server.base_url, timeout=5)
+        cancel = CancelToken()
+        frames = []
+        with self.assertRaises(RequestCancelled):
+            for frame in client.chat_stream("llama3", [{"role": "user", "content": "hi"}], cancel=cancel):
+                frames.append(frame)
+                if len(frames) == 2:
+                    cancel.cancel()
+        self.assertEqual(len(frames), 2)
+        self.assertTrue(client.chat("llama3", [{"role": "user", "content": "hi"}])["done"])
+
+    def test_for_url_shares_and_grows(self):
+        url = self.server.base_url + "/shared"
+        pool = ConnectionPool.for_url(url, maxsize=2)
+        self.assertIs(ConnectionPool.for_url(url, maxsize=5), pool)
+        self.assertEqual(pool.maxsize, 5)
+        self.assertEqual(ConnectionPool.for_url(url, maxsize=3).maxsize, 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
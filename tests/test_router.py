@@ -0,0 +1,90 @@
+"""OllamaRouter against local fake Ollama servers (benchmarks/fake_ollama.py).
+
+Run from the repository root: python -m pytest tests
+"""
+import os
+import socket
+import sys
+import unittest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+from Ollama import OllamaClient, OllamaRouter, ResponseError
+from fake_ollama import FakeOllamaServer
+
+
+def unused_url() -> str:
+    # a port nothing listens on, i.e. a host that is down
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return f"http://127.0.0.1:{sock.getsockname()[1]}"
+
+
+class RouterTest(unittest.TestCase):
+    def setUp(self):
+        self.servers = [FakeOllamaServer(tokens=3, models=models).start()
+                        for models in (("llama3",), ("llama3", "mistral"))]
+
+    def tearDown(self):
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
+
+    def router(self, urls=None) -> OllamaRouter:
+        return OllamaRouter(urls or [server.base_url for server in self.servers], timeout=5)
+
+    def backend(self, router, server):
+        return next(b for b in router._backends if b.client.base_url == server.base_url)
+
+    def test_routes_to_server_with_model(self):
+        router = self.router()
+        self.assertEqual(router.generate("mistral", "hi")["model"], "mistral")
+        self.assertIn("mistral", self.backend(router, self.servers[1]).loaded)
+        self.assertNotIn("mistral", self.backend(router, self.servers[0]).loaded)
+
+    def test_client_error_does_not_mark_hosts_failed(self):
+        router = self.router()
+        with self.assertRaises(ResponseError) as raised:
+            router.generate("bad", "hi")
+        self.assertEqual(raised.exception.status, 404)
+        self.assertTrue(all(b.failed_until == 0.0 for b in router._backends))
+        self.assertTrue(router.generate("llama3", "hi")["done"])
+        with self.assertRaises(ResponseError):
+            list(router.chat_stream("bad", [{"role": "user", "content": "hi"}]))
+        self.assertTrue(all(b.failed_until == 0.0 for b in router._backends))
+
+    def test_fails_over_on_server_error(self):
+        router = self.router()
+        self.servers[0].error_status = 500
+        for _ in range(3):
+            self.assertTrue(router.chat("llama3", [{"role": "user", "content": "hi"}])["done"])
+        self.assertGreater(self.backend(router, self.servers[0]).failed_until, 0.0)
+        self.assertEqual(self.backend(router, self.servers[1]).failed_until, 0.0)
+
+    def test_fails_over_when_host_is_down(self):
+        router = self.router([unused_url(), self.servers[0].base_url])
+        tokens = [r["message"]["content"] for r in router.chat_stream("llama3", [{"role": "user", "content": "hi"}])]
+        self.assertEqual(len(tokens), 4)  # 3 tokens and the done frame
+        self.assertGreater(router._backends[0].failed_until, 0.0)
+
+    def test_fails_over_when_host_hangs(self):
+        hung = self.servers[0]
+        hung.latency = 5
+        OllamaClient(hung.base_url).list_models()  # a pool without timeout exists already
+        router = OllamaRouter([hung.base_url, self.servers[1].base_url], timeout=0.5)
+        router.discover()
+        self.backend(router, hung).loaded.add("llama3")  # preferred
+        self.assertTrue(router.generate("llama3", "hi")["done"])
+        self.assertGreater(self.backend(router, hung).failed_until, 0.0)
+
+    def test_retries_failed_hosts_when_all_failed(self):
+        router = self.router()
+        router.discover()
+        for backend in router._backends:
+            backend.failed_until = float("inf")
+        self.assertTrue(router.generate("llama3", "hi")["done"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,124 @@
+"""RequestScheduler admission, on its own and in front of a local fake Ollama server (benchmarks/fake_ollama.py).
+
+Run from the repository root: python -m pytest tests
+"""
+import os
+import sys
+import threading
+import time
+import unittest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+from Ollama import BACKGROUND, INTERACTIVE, CancelToken, OllamaClient, RequestCancelled, RequestScheduler
+from fake_ollama import FakeOllamaServer
+
+
+def wait_until(condition, timeout: float = 5.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+class SchedulerTest(unittest.TestCase):
+    def waiter(self, scheduler, model, priority, admitted, cancel=None):
+        # acquire in a thread and append priority to admitted once the slot is granted
+        def run():
+            try:
+                scheduler.acquire(model, priority, cancel)
+            except RequestCancelled:
+                admitted.append("cancelled")
+                return
+            admitted.append(priority)
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        return thread
+
+    def test_interactive_admitted_before_earlier_background(self):
+        scheduler = RequestScheduler(max_parallel=1, reserve_interactive=0)
+        scheduler.acquire("llama3")
+        admitted = []
+        self.waiter(scheduler, "llama3", BACKGROUND, admitted)
+        self.assertTrue(wait_until(lambda: scheduler.stats()["waiting"].get("llama3") == 1))
+        self.waiter(scheduler, "llama3", INTERACTIVE, admitted)
+        self.assertTrue(wait_until(lambda: scheduler.stats()["waiting"].get("llama3") == 2))
+        scheduler.release("llama3")
+        self.assertTrue(wait_until(lambda: admitted == [INTERACTIVE]))
+        scheduler.release("llama3")
+        self.assertTrue(wait_until(lambda: admitted == [INTERACTIVE, BACKGROUND]))
+
+    def test_models_are_scheduled_separately(self):
+        scheduler = RequestScheduler(max_parallel=1, reserve_interactive=0)
+        scheduler.acquire("llama3")
+        scheduler.acquire("mistral:latest")
+        self.assertEqual(scheduler.stats()["running"], {"llama3": 1, "mistral": 1})
+
+    def test_background_leaves_reserved_slot(self):
+        scheduler = RequestScheduler(max_parallel=2, reserve_interactive=1)
+        scheduler.acquire("llama3", BACKGROUND)
+        admitted = []
+        self.waiter(scheduler, "llama3", BACKGROUND, admitted)
+        self.assertTrue(wait_until(lambda: scheduler.stats()["waiting"].get("llama3") == 1))
+        self.assertEqual(admitted, [])
+        scheduler.acquire("llama3", INTERACTIVE)  # the reserved slot, right away
+        self.assertEqual(scheduler.stats()["running"], {"llama3": 2})
+
+    def test_reserve_keeps_one_slot_for_background(self):
+        self.assertEqual(RequestScheduler(max_parallel=1, reserve_interactive=1).reserve_interactive, 0)
+        self.assertEqual(RequestScheduler(max_parallel=4, reserve_interactive=8).reserve_interactive, 3)
+
+    def test_cancel_while_waiting(self):
+        scheduler = RequestScheduler(max_parallel=1, reserve_interactive=0)
+        scheduler.acquire("llama3")
+        admitted, cancel = [], CancelToken()
+        cancelled = self.waiter(scheduler, "llama3", INTERACTIVE, admitted, cancel)
+        self.waiter(scheduler, "llama3", BACKGROUND, admitted)
+        self.assertTrue(wait_until(lambda: scheduler.stats()["waiting"].get("llama3") == 2))
+        cancel.cancel()
+        cancelled.join(5)
+        self.assertEqual(admitted, ["cancelled"])
+        self.assertEqual(scheduler.stats()["waiting"], {"llama3": 1})
+        # the cancelled head of the queue does not block the next waiter
+        scheduler.release("llama3")
+        self.assertTrue(wait_until(lambda: admitted == ["cancelled", BACKGROUND]))
+
+    def test_slot_released_on_error(self):
+        scheduler = RequestScheduler(max_parallel=1)
+        with self.assertRaises(ValueError):
+            with scheduler.slot("llama3"):
+                raise ValueError()
+        self.assertEqual(scheduler.stats()["running"], {})
+
+
+class ScheduledClientTest(unittest.TestCase):
+    def setUp(self):
+        self.server = FakeOllamaServer(tokens=3, latency=0.5).start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_interactive_request_does_not_wait_behind_background_burst(self):
+        scheduler = RequestScheduler(max_parallel=2, reserve_interactive=1)
+        background = OllamaClient(self.server.base_url, scheduler=scheduler, priority=BACKGROUND, timeout=10)
+        interactive = background.with_priority(INTERACTIVE)
+        threads = [threading.Thread(target=background.generate, args=("llama3", "hi"), daemon=True) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        self.assertTrue(wait_until(lambda: scheduler.stats()["waiting"].get("llama3") == 2))
+        started = time.monotonic()
+        self.assertTrue(interactive.generate("llama3", "hi")["done"])
+        # one server latency, not the three background requests ahead of it
+        self.assertLess(time.monotonic() - started, 1.0)
+        self.assertTrue(scheduler.stats()["waiting"].get("llama3"))  # the background burst is still queued
+        for thread in threads:
+            thread.join(10)
+        self.assertEqual(scheduler.stats(), {"running": {}, "waiting": {}})
+
+
+if __name__ == "__main__":
+    unittest.main()